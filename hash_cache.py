@@ -0,0 +1,169 @@
+"""On-disk cache of file digests shared by week12, week25 and week26.
+
+Digests are stored in the SQLite database keyed by the device, inode, size and
+modification time (in nanoseconds) of the file, together with the name of the
+hashing algorithm. As long as the file is not modified, its digest is found
+in the cache after a single stat call. When the number of cached digests
+exceeds the limit, the oldest entries are removed.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+DATABASE = '/tmp/hash_cache.db'
+MAX_ENTRIES = 1000000   # maximal number of cached digests
+CHECK_EVERY = 1000      # number of insertions between checks of the size
+BUFSIZE = 1048576       # 1MB chunk
+ALGORITHMS = ('md5', 'sha1', 'blake2b')
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS digests (
+               device INTEGER NOT NULL,
+               inode INTEGER NOT NULL,
+               size INTEGER NOT NULL,
+               mtime_ns INTEGER NOT NULL,
+               algorithm TEXT NOT NULL,
+               digest TEXT NOT NULL,
+               PRIMARY KEY (device, inode, size, mtime_ns, algorithm) );
+'''
+
+
+def hash_file(file_name, algorithm='sha1'):
+    """Returns the hex digest of the file contents, read in chunks of BUFSIZE,
+    calculated with one of ALGORITHMS. Raises OSError if the file can not be
+    read.
+    """
+
+    digest = hashlib.new(algorithm)
+    with open(file_name, 'rb') as f:
+        while True:
+            data = f.read(BUFSIZE)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """Returns digests of files, calculating only those not found in the cache.
+    Every thread uses its own connection to the database, so the object can be
+    shared by hashing threads.
+    """
+
+    def __init__(self, database=DATABASE, max_entries=MAX_ENTRIES):
+        self.database = database
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    def _connection(self):
+        """Returns the database connection of the current thread."""
+
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.database, timeout=30)
+            # losing a few recent digests after a crash is harmless
+            con.execute('PRAGMA journal_mode = WAL')
+            con.execute('PRAGMA synchronous = OFF')
+            with con:
+                con.executescript(SCHEMA)
+            self._local.con = con
+            self._local.inserted = 0
+        return con
+
+    def _lookup(self, file_name, algorithm, stat):
+        """Returns the key of the file in the cache, the database connection
+        (None if the cache is not usable) and the cached digest (None if not
+        found). Raises OSError if the file can not be accessed.
+        """
+
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f'Unsupported algorithm: {algorithm}')
+        if stat is None:
+            stat = os.stat(file_name)
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns,
+               algorithm)
+        try:
+            con = self._connection()
+            row = con.execute('SELECT digest FROM digests WHERE device = ? AND '
+                              'inode = ? AND size = ? AND mtime_ns = ? AND '
+                              'algorithm = ?', key).fetchone()
+        except sqlite3.Error:
+            # the cache is not usable, but digests can still be calculated
+            return key, None, None
+        return key, con, None if row is None else row[0]
+
+    def digest(self, file_name, algorithm='sha1', stat=None, use_cache=True):
+        """Returns the hex digest of the file or None if the file could not be
+        read. The result of os.stat for the file can be passed in the stat
+        argument if it is already known. When use_cache is false the digest
+        is calculated even if it is cached, and replaces the cached one.
+        """
+
+        return self.hashed_digest(file_name, algorithm, stat, use_cache)[0]
+
+    def hashed_digest(self, file_name, algorithm='sha1', stat=None,
+                      use_cache=True):
+        """Works like digest, but returns a tuple of the digest and True if
+        the file has been read, or False if the digest was found in the cache.
+        """
+
+        try:
+            key, con, digest = self._lookup(file_name, algorithm, stat)
+        except OSError:
+            return None, True
+        if digest is not None and use_cache:
+            return digest, False
+        try:
+            digest = hash_file(file_name, algorithm)
+        except OSError:
+            return None, True
+        if con is not None:
+            try:
+                with con:
+                    con.execute('INSERT OR REPLACE INTO digests VALUES '
+                                '(?, ?, ?, ?, ?, ?)', (*key, digest))
+                self._local.inserted += 1
+                if self._local.inserted % CHECK_EVERY == 0:
+                    self._evict(con)
+            except sqlite3.Error:
+                pass
+        return digest, True
+
+    def _evict(self, con):
+        """Removes the oldest digests exceeding max_entries."""
+
+        count = con.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+        if count > self.max_entries:
+            with con:
+                con.execute('DELETE FROM digests WHERE rowid IN (SELECT rowid '
+                            'FROM digests ORDER BY rowid LIMIT ?)',
+                            (count - self.max_entries, ))
+
+
+# cache shared by all users within the process, setting it to None disables
+# caching
+default_cache = HashCache()
+
+
+def file_digest(file_name, algorithm='sha1', stat=None, use_cache=True):
+    """Returns the hex digest of the file using the shared cache, or None if
+    the file could not be read. When use_cache is false the file is always
+    read, the shared cache is only updated.
+    """
+
+    return hashed_digest(file_name, algorithm, stat, use_cache)[0]
+
+
+def hashed_digest(file_name, algorithm='sha1', stat=None, use_cache=True):
+    """Works like file_digest, but returns a tuple of the digest and True if
+    the file has been read, or False if the digest was found in the cache.
+    """
+
+    if default_cache is not None:
+        return default_cache.hashed_digest(file_name, algorithm, stat,
+                                           use_cache)
+    try:
+        return hash_file(file_name, algorithm), True
+    except OSError:
+        return None, True
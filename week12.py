@@ -1,18 +1,15 @@
 from pathlib import Path
-import hashlib
+from hash_cache import file_digest
 
 class DirFileHash:
 
-    def __init__(self, dirname):
+    def __init__(self, dirname, algorithm='md5'):
         self.path = Path(dirname)
+        self.algorithm = algorithm
 
     def __getitem__(self, key):
         if not self.path.joinpath(key).is_file():
             return None
-        try:
-            with open(self.path.joinpath(key), 'rb') as file_:
-                return hashlib.md5(file_.read()).hexdigest()
-        except PermissionError:
-            return None
-
-
+        # digests come from the shared cache, the file is read in chunks
+        # only when it has changed since the last time
+        return file_digest(self.path.joinpath(key), self.algorithm)
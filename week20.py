@@ -1,31 +1,141 @@
 import argparse
+import os
+import sys
+import time
 
 default = 3                     # default number of lines to print
-parser = argparse.ArgumentParser(description='Combines head & tail commands together')
-parser.add_argument('-s', '--start', nargs='?', type=int, default=default,
-                    metavar='number', help='number of the head lines, default: 3')
-parser.add_argument('-e', '--end', nargs='?', type=int, default=default,
-                    metavar='number', help='number of the tail lines, default: 3')
-parser.add_argument('-f', '--file', required=True, metavar='name',
-                    help='required name of the file to display')
-arguments = parser.parse_args()
-# if optional argument is present but without a number then it is set to None
-head = default if arguments.start is None or arguments.start < 0 else arguments.start
-tail = default if arguments.end is None or arguments.end < 0 else arguments.end
-
-try:
-    with open(arguments.file, 'r') as infile:
-        all_lines = infile.readlines()
-except OSError as e:
-    print(f'File: < {arguments.file} > can not be opened\n{e.strerror}')
-    raise SystemExit
-
-if head + tail > len(all_lines):
-    head = len(all_lines)
-print(''.join(all_lines[:head]), end='')
-skipped = len(all_lines) - head - tail
-if skipped > 0:
-    print(f'... <<< skipped {skipped} lines of {arguments.file} >>> ...')
-if skipped >= 0 and tail > 0:
-    print(''.join(all_lines[-tail:]), end='')
+BLOCK = 65536                   # size of blocks read backwards from the end
+INTERVAL = 1.0                  # seconds between checks of followed files
 
+
+def head_lines(infile, count):
+    """Returns the list of first count lines of the binary file (read line by
+    line from the beginning) and the offset just after them.
+    """
+    lines = []
+    for i in range(count):
+        line = infile.readline()
+        if not line:
+            break
+        lines.append(line)
+    return lines, infile.tell()
+
+
+def tail_lines(infile, count, limit=0):
+    """Returns the list of last count lines of the binary file, but not those
+    before the limit offset, and the offset of the first of them. The file is
+    read backwards in blocks, so only the end of the file is read.
+    """
+    size = infile.seek(0, os.SEEK_END)
+    if count == 0 or size <= limit:
+        return [], size
+    infile.seek(size - 1)
+    # the newline terminating the last line does not separate it from the next
+    newlines = -1 if infile.read(1) == b'\n' else 0
+    blocks = []
+    position = size
+    while position > limit and newlines < count:
+        step = min(BLOCK, position - limit)
+        position -= step
+        infile.seek(position)
+        block = infile.read(step)
+        blocks.append(block)
+        newlines += block.count(b'\n')
+    # only newlines end lines, bytes.splitlines would split also at a lone \r
+    *lines, last = b''.join(reversed(blocks)).split(b'\n')
+    lines = [line + b'\n' for line in lines] + ([last] if last else [])
+    lines = lines[-count:]
+    return lines, size - sum(len(line) for line in lines)
+
+
+def show(file_name, head, tail, out):
+    """Writes head and tail lines of the file to the binary out stream.
+    Returns the size of the file or None if it can not be opened.
+    """
+    try:
+        with open(file_name, 'rb') as infile:
+            first, head_end = head_lines(infile, head)
+            last, tail_start = tail_lines(infile, tail, head_end)
+    except OSError as e:
+        print(f'File: < {file_name} > can not be opened\n{e.strerror}')
+        sys.stdout.flush()
+        return None
+    out.writelines(first)
+    skipped = tail_start - head_end
+    if skipped > 0:
+        out.write(f'... <<< skipped {skipped} bytes of {file_name} >>> ...\n'
+                  .encode())
+    out.writelines(last)
+    return tail_start + sum(len(line) for line in last)
+
+
+def follow(offsets, out, interval=INTERVAL):
+    """Writes data appended to the files after their offsets (dictionary of
+    file name -> offset) until interrupted. A file truncated or replaced by
+    a new one (e.g. rotated log) is written from its beginning.
+    """
+    files = {}
+    current = None
+    try:
+        while True:
+            for file_name, offset in offsets.items():
+                try:
+                    stat = os.stat(file_name)
+                except OSError:
+                    continue
+                infile = files.get(file_name)
+                if infile is not None and (
+                        os.fstat(infile.fileno()).st_ino != stat.st_ino or
+                        stat.st_size < offset):
+                    files.pop(file_name).close()
+                    infile = None
+                    offset = 0
+                if stat.st_size == offset:
+                    offsets[file_name] = offset
+                    continue
+                if infile is None:
+                    infile = files[file_name] = open(file_name, 'rb')
+                infile.seek(offset)
+                data = infile.read()
+                if len(offsets) > 1 and current != file_name:
+                    out.write(f'\n==> {file_name} <==\n'.encode())
+                    current = file_name
+                out.write(data)
+                out.flush()
+                offsets[file_name] = offset + len(data)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for infile in files.values():
+            infile.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Combines head & tail commands together')
+    parser.add_argument('-s', '--start', nargs='?', type=int, default=default,
+                        metavar='number', help='number of the head lines, default: 3')
+    parser.add_argument('-e', '--end', nargs='?', type=int, default=default,
+                        metavar='number', help='number of the tail lines, default: 3')
+    parser.add_argument('-f', '--file', required=True, nargs='+', metavar='name',
+                        help='required names of the files to display')
+    parser.add_argument('-F', '--follow', action='store_true',
+                        help='output data appended to the files until interrupted')
+    arguments = parser.parse_args()
+    # if optional argument is present but without a number then it is set to None
+    head = default if arguments.start is None or arguments.start < 0 else arguments.start
+    tail = default if arguments.end is None or arguments.end < 0 else arguments.end
+
+    out = sys.stdout.buffer
+    offsets = {}
+    for number, file_name in enumerate(arguments.file):
+        if len(arguments.file) > 1:
+            separator = '\n' if number else ''
+            out.write(f'{separator}==> {file_name} <==\n'.encode())
+        out.flush()
+        size = show(file_name, head, tail, out)
+        if size is not None:
+            offsets[file_name] = size
+    out.flush()
+    if arguments.follow and offsets:
+        follow(offsets, out)
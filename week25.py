@@ -1,31 +1,52 @@
 import os
 from os.path import join, isfile
-import hashlib
 import sys
 import pprint
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from hash_cache import file_digest
 
+MAX_BYTES = 268435456   # 256MB of file data being hashed at most at a time
 
-def get_hash(file_name):
-    BUFSIZE = 1048576   # 1MB chunk
-    sha1 = hashlib.sha1()
-    try:
-        with open(file_name, 'rb') as f:
-            while True:
-                data = f.read(BUFSIZE)
-                if not data:
-                    break
-                sha1.update(data)
-        return sha1.hexdigest()
-    except IOError:
-        return None
 
+def get_hash(file_name, stat=None):
+    return file_digest(file_name, 'sha1', stat)
 
-def sha_info(directory):
-    return [{'file': join(root, one_file),
-             'timestamp': int(os.stat(join(root, one_file)).st_mtime),
-             'sha1': get_hash(join(root, one_file))}
-                for root, dirs, files in os.walk(directory)
-                for one_file in files if isfile(join(root, one_file))]
+
+def file_info(file_name, stat=None):
+    if stat is None:
+        stat = os.stat(file_name)
+    return {'file': file_name,
+            'timestamp': int(stat.st_mtime),
+            'sha1': get_hash(file_name, stat)}
+
+
+def sha_info(directory, workers=None, max_bytes=MAX_BYTES):
+    if not workers:
+        return [file_info(join(root, one_file))
+                    for root, dirs, files in os.walk(directory)
+                    for one_file in files if isfile(join(root, one_file))]
+    # files are hashed by a pool of threads while the directory is still
+    # walked, but only up to max_bytes of data can wait for processing
+    info = []
+    pending = deque()
+    in_flight = 0
+    with ThreadPoolExecutor(workers) as pool:
+        for root, dirs, files in os.walk(directory):
+            for one_file in files:
+                file_name = join(root, one_file)
+                if not isfile(file_name):
+                    continue
+                stat = os.stat(file_name)
+                while pending and in_flight + stat.st_size > max_bytes:
+                    future, size = pending.popleft()
+                    info.append(future.result())
+                    in_flight -= size
+                pending.append((pool.submit(file_info, file_name, stat),
+                                stat.st_size))
+                in_flight += stat.st_size
+        info.extend(future.result() for future, size in pending)
+    return info
 
 
 if __name__ == '__main__':
@@ -33,6 +54,8 @@ if __name__ == '__main__':
         print('Name of the directory expected, found none')
     elif not os.access(sys.argv[1], os.R_OK):
         print(f'Unable to process {sys.argv[1]} directory')
+    elif len(sys.argv) > 2:
+        # optional second argument is the number of hashing threads
+        pprint.pprint(sha_info(sys.argv[1], int(sys.argv[2])))
     else:
         pprint.pprint(sha_info(sys.argv[1]))
-
@@ -1,8 +1,12 @@
 import os
 from os.path import join, isfile, isdir
-import hashlib
 import time
 import pickle
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from hash_cache import file_digest, hashed_digest
+
+MAX_BYTES = 268435456   # 256MB of file data being hashed at most at a time
 
 
 class FileInfo:
@@ -10,35 +14,64 @@ class FileInfo:
         absolute path, time of the last modification and SHA-1 digest of its
         content.
     """
-    def __init__(self, filepath):
+    def __init__(self, filepath, previous=None, stat=None, use_cache=True):
+        """ When previous FileInfo object for the same file is given and the
+            file's inode, size and modification time (in nanoseconds) did not
+            change since then, the SHA-1 digest is reused instead of being
+            calculated again. The result of os.stat for the file can be
+            passed in the stat argument if it is already known. When use_cache
+            is false, the digest is calculated even if it is found in the
+            shared hash cache. The hashed attribute is true only if the file
+            contents have been read.
+        """
         # storing an absolute path of the file assures that every one is unique
         self.filepath = os.path.abspath(filepath)
-        self.timestamp = os.stat(self.filepath).st_mtime
-        self.sha1 = self.get_sha1(self.filepath)
+        if stat is None:
+            stat = os.stat(self.filepath)
+        self.timestamp = stat.st_mtime
+        self.signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        # objects restored from older snapshots may not have the signature
+        if (previous is not None and
+                getattr(previous, 'signature', None) == self.signature):
+            self.sha1 = previous.sha1
+            self.hashed = False
+        else:
+            self.sha1, self.hashed = hashed_digest(self.filepath, 'sha1', stat,
+                                                   use_cache)
+
+    @classmethod
+    def from_record(cls, filepath, timestamp, sha1, signature=None):
+        """ Recreates the FileInfo object from previously stored values
+            without accessing the file on disk.
+        """
+        info = cls.__new__(cls)
+        info.filepath = filepath
+        info.timestamp = timestamp
+        info.signature = signature
+        info.sha1 = sha1
+        info.hashed = False
+        return info
 
     @staticmethod   # can be used as a class method
-    def get_sha1(file_name):
+    def get_sha1(file_name, stat=None, use_cache=True):
         """ Returns an SHA-1 digest of the file given by its name: file_name. 
-            Returns None if the file could not be read. The method processes
-            file contents in chunks of BUFSIZE size, threfeore it is suitable
-            for large files as well.
+            Returns None if the file could not be read. Digests are taken from
+            the shared hash cache when the file has not changed, otherwise the
+            file contents are processed in chunks, threfeore it is suitable
+            for large files as well. The result of os.stat for the file can be
+            passed in the stat argument if it is already known. When use_cache
+            is false, the file is read even if its digest is cached.
         """
-        BUFSIZE = 1048576   # 1MB chunk, can be optimised if needed
-        sha1 = hashlib.sha1()
-        try:
-            with open(file_name, 'rb') as f:
-                while True:
-                    data = f.read(BUFSIZE)
-                    if not data:
-                        break
-                    sha1.update(data)
-            return sha1.hexdigest()
-        except IOError:
-            return None
+        return file_digest(file_name, 'sha1', stat, use_cache)
 
     def __eq__(self, other):
-        """ Defines equivalenece of objects by comparing all its attributes."""
-        return vars(self) == vars(other)
+        """ Defines equivalenece of objects by comparing their paths,
+            modification times and SHA-1 digests. The remaining attributes
+            only support fast rescans and are deliberately ignored, so objects
+            restored from older snapshots still compare as expected.
+        """
+        return ((self.filepath, self.timestamp, self.sha1) ==
+                (other.filepath, other.timestamp, other.sha1))
 
     def __hash__(self):
         """ All absolute paths are unique, therefore it is sufficient to
@@ -53,6 +86,43 @@ class FileInfo:
                 f'sha1:\t\t{self.sha1}')
 
 
+class CompactFileInfo:
+    """ Memory efficient variant of FileInfo with the same public attributes.
+        Objects have no per-instance dictionary, the SHA-1 digest is kept as
+        20 bytes and the signature as three separate integers, the hex digest
+        and the signature tuple are recreated on access.
+    """
+    __slots__ = ('filepath', 'timestamp', '_digest', '_inode', '_size',
+                 '_mtime_ns', 'hashed')
+
+    @property
+    def sha1(self):
+        return None if self._digest is None else self._digest.hex()
+
+    @sha1.setter
+    def sha1(self, value):
+        self._digest = None if value is None else bytes.fromhex(value)
+
+    @property
+    def signature(self):
+        if self._inode is None:
+            return None
+        return (self._inode, self._size, self._mtime_ns)
+
+    @signature.setter
+    def signature(self, value):
+        self._inode, self._size, self._mtime_ns = value or (None, None, None)
+
+    # FileInfo methods only assign and read the public attributes, so they
+    # work with the properties above as well
+    __init__ = FileInfo.__init__
+    from_record = classmethod(FileInfo.from_record.__func__)
+    get_sha1 = staticmethod(FileInfo.get_sha1)
+    __eq__ = FileInfo.__eq__
+    __hash__ = FileInfo.__hash__
+    __str__ = FileInfo.__str__
+
+
 class DirectoryFileError(Exception):
     """ Custom exception class used by FileList objects."""
     pass
@@ -64,63 +134,199 @@ class FileList:
         files can not be accessed.
     """
 
-    def __init__(self, arg=None):
+    def __init__(self, arg=None, workers=None, max_bytes=MAX_BYTES,
+                 compact=False, progress=None):
         """ When the FileList object is instantiated without any arguments then
             the current directory is processed. When the name of the directory
             is given then that directory and its subdirectories are processed.
             Alternatively, when the argument is the name of the file, then it is
             assumed that file contains serialised attributes of FileList object
-            and an attempt is made to restore the object.
+            and an attempt is made to restore the object. When the number of
+            workers is given, files are hashed by a pool of that many threads
+            while the directory is still being walked, max_bytes limits the
+            total size of files submitted to the pool and not yet processed.
+            When compact is true, files are described by CompactFileInfo
+            objects instead of FileInfo ones. The optional progress function
+            is called with every FileInfo object created during the scan.
         """
         if arg is None:
             path = os.path.abspath('.')
         else:
             path = os.path.abspath(arg)
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.compact = compact
         if isdir(path) and os.access(path, os.R_OK):
-            self.files_info = self._get_files_info(path)    # set of FileInfo objects
+            # dictionary of FileInfo objects keyed by paths
+            self.files_info = self._get_files_info(path, progress=progress)
             self.timestamp = time.time()                    # current time
             self.directory = path                           # absolute directory
+            # files hashed and reused (from the cache) last time
+            self.hashed = sum(1 for item in self.files_info.values()
+                              if item.hashed)
+            self.skipped = len(self.files_info) - self.hashed
         elif isfile(path) and os.access(path, os.R_OK):
-            self._load_data(path)                           
+            self._load_data(path)
+            # scanning settings are not a part of the snapshot
+            self.workers = workers
+            self.max_bytes = max_bytes
+            self.compact = compact
         else:
             raise DirectoryFileError(f'Unable to process: {path}')
  
-    def _get_files_info(self, directory):
-        """ Returns the set of FileInfo objects, each object for one file within
-            directory and its subdirectories.
+    @classmethod
+    def from_files(cls, directory, timestamp, files_info, workers=None,
+                   max_bytes=MAX_BYTES, compact=False):
+        """ Recreates the FileList object of the absolute directory scanned at
+            the given time from the dictionary of FileInfo objects keyed by
+            paths, e.g. restored from a snapshot store. The directory is not
+            scanned.
+        """
+        file_list = cls.__new__(cls)
+        file_list.workers = workers
+        file_list.max_bytes = max_bytes
+        file_list.compact = compact
+        file_list.files_info = files_info
+        file_list.timestamp = timestamp
+        file_list.directory = directory
+        file_list.hashed = 0
+        file_list.skipped = 0
+        return file_list
+
+    def _get_files_info(self, directory, previous=None, progress=None,
+                        use_cache=True):
+        """ Returns the dictionary of FileInfo objects keyed by their absolute
+            paths, one object for each file within directory and its
+            subdirectories. The optional previous argument is a dictionary of
+            the same kind from the earlier scan, SHA-1 digests of its objects
+            are reused for unchanged files. The optional progress function is
+            called with each created FileInfo object. When use_cache is false,
+            digests are not taken from the shared hash cache.
+        """
+        if previous is None:
+            previous = {}
+        if self.workers:
+            return self._get_files_info_pool(directory, previous, progress,
+                                             use_cache)
+        files_info = {}
+        for one_file_path in self._walk(directory):
+            info = self._info_class()(one_file_path,
+                                      previous.get(one_file_path),
+                                      use_cache=use_cache)
+            files_info[info.filepath] = info
+            if progress is not None:
+                progress(info)
+        return files_info
+
+    def _get_files_info_pool(self, directory, previous, progress=None,
+                             use_cache=True):
+        """ Works like _get_files_info, but FileInfo objects are created by
+            the pool of worker threads (hashlib releases the GIL while
+            hashing). The directory walk does not wait for the results until
+            the size of files in flight would exceed max_bytes.
+        """
+        files_info = {}
+        pending = deque()   # (future, size) pairs in the submission order
+        in_flight = 0
+        with ThreadPoolExecutor(self.workers) as pool:
+            for one_file_path in self._walk(directory):
+                stat = os.stat(one_file_path)
+                while pending and in_flight + stat.st_size > self.max_bytes:
+                    future, size = pending.popleft()
+                    info = future.result()
+                    files_info[info.filepath] = info
+                    in_flight -= size
+                    if progress is not None:
+                        progress(info)
+                future = pool.submit(self._info_class(), one_file_path,
+                                     previous.get(one_file_path), stat,
+                                     use_cache)
+                pending.append((future, stat.st_size))
+                in_flight += stat.st_size
+            for future, size in pending:
+                info = future.result()
+                files_info[info.filepath] = info
+                if progress is not None:
+                    progress(info)
+        return files_info
+
+    def _info_class(self):
+        """ Returns the class of objects describing scanned files."""
+        return CompactFileInfo if self.compact else FileInfo
+
+    @staticmethod
+    def _walk(directory):
+        """ Generates paths of all regular files within directory and its
+            subdirectories.
         """
-        files_info = set()
         for root, dirs, files in os.walk(directory):
             for one_file in files:
                 one_file_path = join(root, one_file)
                 if isfile(one_file_path):   # include only regular files
-                    files_info.add(FileInfo(one_file_path))
-        return files_info
+                    yield one_file_path
 
-    def rescan(self):
+    @staticmethod
+    def diff(old_info, new_info):
+        """ Generates the differences between two dictionaries of FileInfo
+            objects keyed by paths, as returned by _get_files_info. Yields
+            tuples (kind, filepath), where kind is one of: 'added', 'removed'
+            or 'changed'. Every path is looked up only once, therefore the
+            running time is proportional to the total number of files.
+        """
+        for filepath, info in new_info.items():
+            old = old_info.get(filepath)
+            if old is None:
+                yield 'added', filepath
+            elif old != info:
+                yield 'changed', filepath
+        for filepath in old_info:
+            if filepath not in new_info:
+                yield 'removed', filepath
+
+    def compare(self, fast=False, progress=None):
+        """ Scans again the same directory and returns a generator of the
+            differences since the previous scan, like iter_rescan, but the
+            object itself is not updated.
+        """
+        previous = self.files_info if fast else None
+        new_info = self._get_files_info(self.directory, previous, progress,
+                                        use_cache=fast)
+        return self.diff(self.files_info, new_info)
+
+    def iter_rescan(self, fast=False, progress=None):
+        """ Scans again the same directory, updates the object and returns
+            a generator of the differences since the previous scan, see diff
+            for the format of its items. The fast and progress arguments have
+            the same meaning as for the rescan method.
+        """
+        if fast:
+            previous = self.files_info
+        else:
+            previous = None
+        new_info = self._get_files_info(self.directory, previous, progress,
+                                        use_cache=fast)
+        self.hashed = sum(1 for item in new_info.values() if item.hashed)
+        self.skipped = len(new_info) - self.hashed
+        old_info = self.files_info
+        self.files_info = new_info
+        self.timestamp = time.time()
+        return self.diff(old_info, new_info)
+
+    def rescan(self, fast=False, progress=None):
         """ Scans again the same directory and finds the differences since the
             previous scan. Returns a dictionary with the keys: added - list of
             added files, removed - list of removed files, changed - list of
-            changed files (altered SHA-1 digest).
-        """
-        new_info = self._get_files_info(self.directory)
-        # updates is a set of FileInfo objects which are not common to both,
-        # files_info and new_info sets, i.e. updates set represents all added,
-        # removed and changed files
-        updates = self.files_info.symmetric_difference(new_info)
-        added = {item for item in updates if item.filepath not in
-                    {item.filepath for item in self.files_info}}
-        removed = {item for item in updates if item.filepath not in
-                    {item.filepath for item in new_info}}
-        changed = updates.difference(added).difference(removed)
-        report = {}
-        report['added'] = [item.filepath for item in added]
-        report['removed'] = [item.filepath for item in removed]
-        # each modified file is represented by two FileInfo objects in the
-        # changed set, but generating a set of their names removes duplicates
-        report['changed'] = list({item.filepath for item in changed})
-        self.files_info = new_info
-        self.timestamp = time.time()
+            changed files (altered SHA-1 digest). In the fast mode only new
+            files and files with a different inode, size or modification time
+            are hashed (unless their digests are found in the shared hash
+            cache), otherwise every file is read. The numbers of hashed and
+            skipped files are available afterwards in the hashed and skipped
+            attributes. The optional progress function is called with each
+            FileInfo object created.
+        """
+        report = {'added': [], 'removed': [], 'changed': []}
+        for kind, filepath in self.iter_rescan(fast, progress):
+            report[kind].append(filepath)
         return report
 
     def default_file_name(self):
@@ -141,7 +347,9 @@ class FileList:
             out_file = self.default_file_name()
         try:
             with open(out_file, 'wb') as outfile:
-                pickle.dump(vars(self), outfile, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump({key: value for key, value in vars(self).items()
+                             if key not in ('workers', 'max_bytes', 'compact')},
+                            outfile, protocol=pickle.HIGHEST_PROTOCOL)
         except (IOError, pickle.PicklingError):
             raise DirectoryFileError(f'Unable to save: {out_file}')
 
@@ -153,6 +361,10 @@ class FileList:
         try:
             with open(in_file, 'rb') as infile:
                 self.__dict__ = pickle.load(infile)
+            # snapshots saved by older versions keep a set of FileInfo objects
+            if isinstance(self.files_info, set):
+                self.files_info = {item.filepath: item
+                                   for item in self.files_info}
         except (IOError, AttributeError, pickle.UnpicklingError):
             raise DirectoryFileError(f'Unable to load: {in_file}')
 
@@ -0,0 +1,101 @@
+"""Benchmarks for directory scanning with FileList and sha_info.
+
+The script generates a temporary directory tree with many small and a few huge
+files, then measures how long it takes to scan it sequentially and with pools
+of hashing threads of various sizes. The tree is scanned once before the
+measurements, so all runs read the files from the page cache. The shared
+hash cache is disabled, so that every run calculates all digests.
+
+With the --memory option the script instead reports how many bytes are needed
+to track a single file with FileInfo and CompactFileInfo objects, kept in
+a dictionary keyed by paths as FileList does.
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+import tracemalloc
+import hash_cache
+from week25 import sha_info
+from week26 import FileList, FileInfo, CompactFileInfo
+
+
+def make_tree(directory, small, small_size, huge, huge_size):
+    """Populates the directory with small and huge files of random content,
+    small files are spread over subdirectories of 100 files each.
+    """
+
+    for i in range(small):
+        subdir = os.path.join(directory, f'dir{i // 100}')
+        os.makedirs(subdir, exist_ok=True)
+        with open(os.path.join(subdir, f'small{i}'), 'wb') as f:
+            f.write(os.urandom(small_size))
+    chunk = os.urandom(1048576)
+    for i in range(huge):
+        with open(os.path.join(directory, f'huge{i}'), 'wb') as f:
+            for j in range(huge_size):
+                f.write(chunk)
+
+
+def timed(func, *args, **kwargs):
+    """Returns the number of seconds spent in the func call."""
+
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bytes_per_file(info_class, count):
+    """Returns the average number of bytes allocated per tracked file when
+    count records of synthetic files are created with info_class.
+    """
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    files_info = {}
+    for i in range(count):
+        filepath = f'/srv/artifacts/build{i // 1000:05}/component/file{i:08}.bin'
+        files_info[filepath] = info_class.from_record(
+            filepath, 1500000000.0 + i,
+            hashlib.sha1(filepath.encode()).hexdigest(),
+            (10000000 + i, 4096 + i, 1500000000000000000 + i))
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks hashing pools')
+    parser.add_argument('--small', type=int, default=5000,
+                        help='number of small files, default: 5000')
+    parser.add_argument('--small-size', type=int, default=4096,
+                        help='size of a small file in bytes, default: 4096')
+    parser.add_argument('--huge', type=int, default=4,
+                        help='number of huge files, default: 4')
+    parser.add_argument('--huge-size', type=int, default=256,
+                        help='size of a huge file in MB, default: 256')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8],
+                        help='sizes of the pools to compare, default: 2 4 8')
+    parser.add_argument('--memory', type=int, metavar='count',
+                        help='only measure memory used by count tracked files')
+    arguments = parser.parse_args()
+    if arguments.memory:
+        for info_class in (FileInfo, CompactFileInfo):
+            print(f'{info_class.__name__:>16}: '
+                  f'{bytes_per_file(info_class, arguments.memory):.0f} '
+                  'bytes per file')
+        raise SystemExit
+    hash_cache.default_cache = None
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(tmp, arguments.small, arguments.small_size,
+                  arguments.huge, arguments.huge_size)
+        sha_info(tmp)   # warms up the page cache
+        print(f'{arguments.small} small and {arguments.huge} huge files')
+        print(f'{"workers":>8} {"FileList":>10} {"sha_info":>10}')
+        print(f'{"-":>8} {timed(FileList, tmp):>9.2f}s '
+              f'{timed(sha_info, tmp):>9.2f}s')
+        for workers in arguments.workers:
+            print(f'{workers:>8} {timed(FileList, tmp, workers):>9.2f}s '
+                  f'{timed(sha_info, tmp, workers):>9.2f}s')
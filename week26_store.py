@@ -0,0 +1,192 @@
+"""SQLite-backed storage of FileList snapshots.
+
+An alternative to pickling the whole FileList object. Every file record is
+kept as a row of the files table, valid from the snapshot in which the file
+appeared (or changed) until the snapshot in which it was removed (or changed
+again). Thanks to that:
+    - many historical snapshots of the same directory can be kept, each one
+      described by a single row of the snapshots table,
+    - after a rescan only the rows of added, removed and changed files are
+      written,
+    - records of selected files can be read without loading the whole snapshot.
+"""
+
+import sqlite3
+from week26 import FileInfo, FileList, DirectoryFileError
+
+DATABASE = '/tmp/week26.db'
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshots (
+               id INTEGER PRIMARY KEY,
+               directory TEXT NOT NULL,
+               timestamp REAL NOT NULL );
+CREATE INDEX IF NOT EXISTS snapshots_directory
+               ON snapshots (directory, timestamp);
+CREATE TABLE IF NOT EXISTS files (
+               directory TEXT NOT NULL,
+               filepath TEXT NOT NULL,
+               timestamp REAL NOT NULL,
+               sha1 TEXT,
+               inode INTEGER,
+               size INTEGER,
+               mtime_ns INTEGER,
+               valid_from INTEGER NOT NULL,
+               valid_to INTEGER );
+CREATE INDEX IF NOT EXISTS files_path
+               ON files (directory, filepath, valid_from);
+'''
+
+
+class SnapshotStore:
+    """Stores and restores snapshots of FileList objects in the SQLite
+    database. Raises DirectoryFileError if the database can not be accessed.
+    """
+
+    def __init__(self, database=DATABASE):
+        try:
+            self.con = sqlite3.connect(database)
+            with self.con:
+                self.con.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            raise DirectoryFileError(f'Unable to open: {database}. {e}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.con.close()
+
+    def save(self, file_list, changes=None):
+        """Saves the current state of the FileList object as a new snapshot
+        and returns its id. When changes, an iterable of (kind, filepath)
+        tuples as generated by FileList.iter_rescan, is given, only the rows
+        of these files are written. In that case the file_list must have been
+        restored from the latest snapshot of its directory (or saved as it)
+        before rescanning, otherwise DirectoryFileError is raised.
+        """
+
+        try:
+            with self.con:
+                cur = self.con.cursor()
+                latest = self._find(file_list.directory)
+                # changes against any other snapshot would corrupt the history
+                if (changes is not None and latest is not None and
+                        getattr(file_list, 'snapshot', None) != latest[0]):
+                    raise DirectoryFileError(
+                        f'Not restored from the latest snapshot: '
+                        f'{file_list.directory}')
+                cur.execute('INSERT INTO snapshots (directory, timestamp) '
+                            'VALUES (?, ?)',
+                            (file_list.directory, file_list.timestamp))
+                snapshot = cur.lastrowid
+                if changes is None or latest is None:
+                    # all rows of the previous snapshot are closed
+                    cur.execute('UPDATE files SET valid_to = ? WHERE '
+                                'directory = ? AND valid_to IS NULL',
+                                (snapshot, file_list.directory))
+                    changes = (('added', filepath)
+                               for filepath in file_list.files_info)
+                for kind, filepath in changes:
+                    if kind != 'added':
+                        cur.execute('UPDATE files SET valid_to = ? WHERE '
+                                    'directory = ? AND filepath = ? AND '
+                                    'valid_to IS NULL',
+                                    (snapshot, file_list.directory, filepath))
+                    if kind != 'removed':
+                        cur.execute('INSERT INTO files VALUES '
+                                    '(?, ?, ?, ?, ?, ?, ?, ?, NULL)',
+                                    (file_list.directory, filepath,
+                                     *self._to_row(file_list.files_info[filepath]),
+                                     snapshot))
+        except sqlite3.Error as e:
+            raise DirectoryFileError(f'Unable to save: {file_list.directory}. {e}')
+        file_list.snapshot = snapshot
+        return snapshot
+
+    def snapshots(self, directory):
+        """Returns a list of (id, timestamp) tuples of all snapshots of the
+        directory, from the oldest to the latest.
+        """
+
+        return self.con.execute('SELECT id, timestamp FROM snapshots WHERE '
+                                'directory = ? ORDER BY timestamp',
+                                (directory, )).fetchall()
+
+    def load(self, directory, timestamp=None, workers=None):
+        """Returns the FileList object restored from the latest snapshot of
+        the directory taken not later than timestamp (by default the latest
+        snapshot at all), its id is kept in the snapshot attribute. Raises
+        DirectoryFileError if there is no such snapshot.
+        """
+
+        snapshot, taken = self._snapshot(directory, timestamp)
+        rows = self.con.execute('SELECT filepath, timestamp, sha1, inode, '
+                                'size, mtime_ns FROM files WHERE ' +
+                                self._VALID, (directory, snapshot, snapshot))
+        files_info = {row[0]: self._from_row(row) for row in rows}
+        file_list = FileList.from_files(directory, taken, files_info, workers)
+        # id of the snapshot, which save checks before writing only changes
+        file_list.snapshot = snapshot
+        return file_list
+
+    def lookup(self, directory, filepaths, timestamp=None):
+        """Returns a dictionary of FileInfo objects, keyed by paths, for these
+        filepaths which were present in the snapshot of the directory (chosen
+        in the same way as by the load method). Only the requested rows are
+        read from the database.
+        """
+
+        snapshot, taken = self._snapshot(directory, timestamp)
+        files_info = {}
+        for filepath in filepaths:
+            row = self.con.execute('SELECT filepath, timestamp, sha1, inode, '
+                                   'size, mtime_ns FROM files WHERE ' +
+                                   self._VALID + ' AND filepath = ?',
+                                   (directory, snapshot, snapshot,
+                                    filepath)).fetchone()
+            if row is not None:
+                files_info[filepath] = self._from_row(row)
+        return files_info
+
+    # rows which belong to the snapshot with a given id
+    _VALID = ('directory = ? AND valid_from <= ? AND '
+              '(valid_to IS NULL OR valid_to > ?)')
+
+    def _find(self, directory, timestamp=None):
+        """Returns (id, timestamp) of the latest snapshot of the directory
+        taken not later than timestamp, or None if there is no such one.
+        """
+
+        if timestamp is None:
+            timestamp = float('inf')
+        return self.con.execute('SELECT id, timestamp FROM snapshots WHERE '
+                                'directory = ? AND timestamp <= ? '
+                                'ORDER BY timestamp DESC LIMIT 1',
+                                (directory, timestamp)).fetchone()
+
+    def _snapshot(self, directory, timestamp):
+        """Works like _find, but raises DirectoryFileError when the snapshot
+        does not exist.
+        """
+
+        found = self._find(directory, timestamp)
+        if found is None:
+            raise DirectoryFileError(f'No snapshot of: {directory}')
+        return found
+
+    @staticmethod
+    def _to_row(info):
+        """Returns the values of the FileInfo object to be stored."""
+
+        signature = getattr(info, 'signature', None) or (None, None, None)
+        return (info.timestamp, info.sha1, *signature)
+
+    @staticmethod
+    def _from_row(row):
+        """Returns the FileInfo object recreated from the database row."""
+
+        signature = tuple(row[3:6]) if row[3] is not None else None
+        return FileInfo.from_record(row[0], row[1], row[2], signature)
@@ -0,0 +1,257 @@
+"""Live monitoring of a directory scanned by FileList.
+
+DirectoryWatcher keeps the FileList object up to date in a background thread.
+On Linux it subscribes to inotify events of the directory and all its
+subdirectories and hashes again only the files which were written, created or
+moved. Where inotify is not available (other systems, some network file
+systems, exhausted watch limit) the directory is polled with fast rescans
+instead. Either way the differences since the last report are collected in
+memory, so the report is ready without walking the directory.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from os.path import join, isfile
+from stat import S_ISREG
+
+# inotify event masks, see inotify(7)
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_ONLYDIR = 0x1000000
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+EVENT = struct.Struct('iIII')   # wd, mask, cookie, length of the name
+BUFSIZE = 65536                 # size of the buffer for inotify events
+
+
+class DirectoryWatcher:
+    """Watches the directory of the FileList object and maintains its
+    files_info incrementally. The watcher runs in a daemon thread started by
+    the start method and stopped by the stop method, it can be used as
+    a context manager as well.
+    """
+
+    def __init__(self, file_list, interval=2.0, use_inotify=True):
+        """The interval is the number of seconds between rescans when the
+        directory has to be polled. Polling is used when use_inotify is False
+        or inotify can not be set up.
+        """
+
+        self.file_list = file_list
+        self.interval = interval
+        # paths touched since the last report mapped to their FileInfo
+        # objects at the time of that report (None for files absent then)
+        self._touched = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._fd = None
+        self._watches = {}      # watch descriptor -> directory path
+        self._libc = None
+        if use_inotify:
+            try:
+                self._setup_inotify()
+            except OSError:
+                self._close_inotify()
+        self.mode = 'polling' if self._fd is None else 'inotify'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        """Starts watching in the background thread."""
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops watching and releases inotify resources."""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._close_inotify()
+
+    def rescan(self, reset=True):
+        """Returns the differences since the previous report (or since the
+        scan) in the same format as FileList.rescan, without walking the
+        directory. The time of the FileList object is updated. When reset is
+        False, the next report is going to include these differences again
+        and the time is not updated.
+        """
+
+        report = {'added': [], 'removed': [], 'changed': []}
+        with self._lock:
+            files_info = self.file_list.files_info
+            for filepath, old in self._touched.items():
+                new = files_info.get(filepath)
+                if old is None and new is not None:
+                    report['added'].append(filepath)
+                elif old is not None and new is None:
+                    report['removed'].append(filepath)
+                elif old is not None and old != new:
+                    report['changed'].append(filepath)
+            if reset:
+                self._touched = {}
+                self.file_list.timestamp = time.time()
+        return report
+
+    def _run(self):
+        """Body of the background thread."""
+
+        while not self._stop.is_set():
+            if self.mode == 'inotify':
+                ready, _, _ = select.select([self._fd], [], [], self.interval)
+                if ready:
+                    self._read_events()
+            else:
+                self._stop.wait(self.interval)
+                if not self._stop.is_set():
+                    self._poll()
+
+    def _poll(self):
+        """Rescans the directory in the fast mode and records the changes."""
+
+        with self._lock:
+            old_info = self.file_list.files_info
+            timestamp = self.file_list.timestamp
+            for kind, filepath in self.file_list.iter_rescan(fast=True):
+                self._touched.setdefault(filepath, old_info.get(filepath))
+            # only the reports move the time of the snapshot forward
+            self.file_list.timestamp = timestamp
+
+    def _update(self, filepath):
+        """Refreshes the information about a single file, hashing it only if
+        its signature has changed. Paths which are not regular files (e.g.
+        named pipes, opening them could block forever) are not tracked, as in
+        FileList._walk.
+        """
+
+        files_info = self.file_list.files_info
+        old = files_info.get(filepath)
+        try:
+            stat = os.stat(filepath)
+            if S_ISREG(stat.st_mode):
+                new = self.file_list._info_class()(filepath, old, stat)
+            else:
+                new = None
+        except OSError:     # file has already disappeared
+            new = None
+        if old is None and new is None:
+            return
+        self._touched.setdefault(filepath, old)
+        if new is None:
+            del files_info[filepath]
+        else:
+            files_info[filepath] = new
+
+    def _remove(self, filepath, directory=False):
+        """Forgets the file, or all files below the directory."""
+
+        files_info = self.file_list.files_info
+        if not directory:
+            if filepath in files_info:
+                self._touched.setdefault(filepath, files_info.pop(filepath))
+            return
+        prefix = filepath + os.sep
+        for one_file in [item for item in files_info
+                         if item == filepath or item.startswith(prefix)]:
+            self._touched.setdefault(one_file, files_info.pop(one_file))
+
+    def _setup_inotify(self):
+        """Creates inotify instance and watches the whole directory tree.
+        Raises OSError if inotify is not available.
+        """
+
+        name = ctypes.util.find_library('c')
+        if name is None:
+            raise OSError('C library not found')
+        self._libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError('inotify is not supported')
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            self._fd = None
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._add_tree(self.file_list.directory)
+
+    def _add_tree(self, directory):
+        """Adds watches for the directory and all its subdirectories."""
+
+        for root, dirs, files in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root),
+                                              WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'Unable to watch: {root}')
+            self._watches[wd] = root
+
+    def _close_inotify(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._watches = {}
+
+    def _read_events(self):
+        """Reads available inotify events and updates the FileList."""
+
+        data = os.read(self._fd, BUFSIZE)
+        new_dirs = []
+        with self._lock:
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # some events were lost, only a rescan can tell the state
+                    self._poll()
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or mask & IN_DELETE_SELF:
+                    continue
+                path = join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        new_dirs.append(path)
+                    elif mask & (IN_MOVED_FROM | IN_DELETE):
+                        self._remove(path, directory=True)
+                elif mask & (IN_MOVED_FROM | IN_DELETE):
+                    self._remove(path)
+                else:
+                    self._update(path)
+            for directory in new_dirs:
+                try:
+                    self._add_tree(directory)
+                except OSError:
+                    # watch limit reached, carry on by polling
+                    self._close_inotify()
+                    self.mode = 'polling'
+                    self._poll()
+                    return
+                for root, dirs, files in os.walk(directory):
+                    for one_file in files:
+                        if isfile(join(root, one_file)):
+                            self._update(join(root, one_file))
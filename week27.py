@@ -1,29 +1,63 @@
 import os
-from flask import Flask
+from itertools import islice
+from flask import Flask, Response, request
 app = Flask(__name__)
 
 @app.route('/scan/')
 @app.route('/scan/<path:directory>')
 def show_files(directory=None):
+    """Lists files in the directory, the optional query parameters are:
+    offset - number of files to skip, limit - maximal number of files to list,
+    depth - how many levels of subdirectories to descend into (0 means only
+    the directory itself) and stream - when present, the list is sent to the
+    client while the directory is still being scanned.
+    """
     if directory is None:
         return 'Please provide the name of a directory to scan'
     absolute_dir = '/' + directory
     if os.path.isdir(absolute_dir):
         if os.access(absolute_dir, os.R_OK):
-            return list_directory(absolute_dir)
+            offset = request.args.get('offset', 0, type=int)
+            limit = request.args.get('limit', None, type=int)
+            depth = request.args.get('depth', None, type=int)
+            if offset < 0 or (limit or 0) < 0 or (depth or 0) < 0:
+                return 'Parameters offset, limit and depth can not be negative'
+            listing = list_directory(absolute_dir, offset, limit, depth)
+            if 'stream' in request.args:
+                return Response(listing, mimetype='text/html')
+            return ''.join(listing)
         else:
             return f'No permission to read: {absolute_dir}'
     else:
         return f'Directory: {absolute_dir} does not exists'
 
-def list_directory(path):
-    files_list = []
-    for root, dirs, files in os.walk(path):
-        for one_file in files:
-            files_list.append(f'{os.path.join(root, one_file)}')
-    return '<br/>'.join(files_list)
+def list_directory(path, offset=0, limit=None, depth=None):
+    """Generates HTML fragments listing the files, separated by line breaks."""
+    files = islice(iter_files(path, depth), offset,
+                   None if limit is None else offset + limit)
+    for number, one_file in enumerate(files):
+        yield one_file if number == 0 else '<br/>' + one_file
+
+def iter_files(path, depth=None):
+    """Generates the names of all files in the directory and its subdirectories
+    (down to depth levels, if given) in the same order as os.walk. The os.scandir
+    entries tell apart files and directories without extra stat calls.
+    """
+    try:
+        with os.scandir(path) as entries:
+            dirs = []
+            for entry in entries:
+                if entry.is_dir():
+                    if not entry.is_symlink():  # os.walk does not follow them
+                        dirs.append(entry.path)
+                else:
+                    yield entry.path
+    except OSError:     # unreadable directories are skipped as by os.walk
+        return
+    if depth is None or depth > 0:
+        for one_dir in dirs:
+            yield from iter_files(one_dir, None if depth is None else depth - 1)
 
 
 if __name__ == '__main__':
     app.run(debug=True)
-
@@ -1,12 +1,103 @@
-import pandas as pd
+""" Simple client for the directory monitoring server from week29_server.
 
-base_url = 'http://127.0.0.1:5000/'
+Started without arguments it runs an interactive menu. Started as:
+    python week29_client.py load [requests] [threads] [directory]
+it starts the server locally in a background thread and measures how many
+rescan requests per second it handles, by default 1000 requests are sent by
+4 threads for the current directory.
+"""
+import http.client
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HOST = '127.0.0.1'
+PORT = 5000
+
+
+class Client:
+    """ Sends commands to the server over one persistent HTTP connection, which
+        is opened again whenever the server closes it. The JSON responses are
+        returned as dictionaries, or None if the server is not responding. One
+        object should not be shared by several threads.
+    """
+
+    def __init__(self, host=HOST, port=PORT, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+
+    def scan(self, directory):
+        return self.get('scan/?' + directory)
+
+    def rescan(self, directory):
+        return self.get('rescan/?' + directory)
+
+    def get(self, url):
+        """ Sends the GET request for the url relative to the server root."""
+        # the request is sent again only if the server has closed the kept
+        # alive connection in the meantime, otherwise (e.g. after a timeout)
+        # it may have been processed already
+        for attempt in range(2):
+            reused = self.conn is not None
+            if not reused:
+                self.conn = http.client.HTTPConnection(self.host, self.port,
+                                                       timeout=self.timeout)
+            sent = False
+            try:
+                self.conn.request('GET', '/' + url)
+                sent = True
+                response = self.conn.getresponse()
+                body = response.read()
+                if response.will_close:
+                    self.close()
+                return json.loads(body)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.close()
+                closed = (isinstance(e, http.client.RemoteDisconnected) or
+                          not sent and isinstance(e, ConnectionError))
+                if not (reused and closed):
+                    return None
+        return None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def batch(self, command, directories, workers=4):
+        """ Sends the command ('scan' or 'rescan') for all directories
+            concurrently, using up to workers connections. Returns the list of
+            responses in the order of directories.
+        """
+        local = threading.local()
+        clients = []
+
+        def one_request(directory):
+            if not hasattr(local, 'client'):
+                local.client = Client(self.host, self.port, self.timeout)
+                clients.append(local.client)
+            return getattr(local.client, command)(directory)
+
+        with ThreadPoolExecutor(workers) as pool:
+            responses = list(pool.map(one_request, directories))
+        for client in clients:
+            client.close()
+        return responses
+
+
+client = Client()
 
 def main_loop():
     print('Simple client for a directory monitoring service.')
     while True:
         print('\nMenu:\n\t0: Exit\n\t1: Take a snapshot of a directory\n\t'
-              '2: Check for changes in a directory')
+              '2: Check for changes in a directory\n\t'
+              '3: Take snapshots of several directories\n\t'
+              '4: Check for changes in several directories')
         choice = input('Please choose: ')
         try:
             menu = int(choice)
@@ -19,24 +110,36 @@ def main_loop():
             scan()
         elif menu == 2:
             rescan()
+        elif menu == 3:
+            batch('scan', print_scan)
+        elif menu == 4:
+            batch('rescan', print_rescan)
         else:
             print(f'Unrecognised option: {str(menu)}')
+    client.close()
     print('Bye!')
 
 def scan():
     directory = input('Directory to scan? ')
-    url = base_url + 'scan/?' + directory
-    ds = get_response(url)
+    print_scan(get_response(client.scan(directory)))
+
+def rescan():
+    directory = input('Directory to check? ')
+    print_rescan(get_response(client.rescan(directory)))
+
+def batch(command, show):
+    directories = input('Directories (separated by commas)? ').split(',')
+    for ds in client.batch(command, [item.strip() for item in directories]):
+        show(get_response(ds))
+
+def print_scan(ds):
     if ds is not None:
         print(ds['message'])
         if ds['status'] == 0:
             print(ds['pathname'] + '\n' + ds['timestamp'])
-        
-def rescan():
-    directory = input('Directory to check? ')
-    url = base_url + 'rescan/?' + directory
-    ds = get_response(url)
-    if ds is not None:  
+
+def print_rescan(ds):
+    if ds is not None:
         print(ds['message'])
         if ds['status'] == 0:
             print('of ' + ds['pathname'])
@@ -47,13 +150,10 @@ def rescan():
             if not changes:
                 print('\tNo changes')
 
-def get_response(url):
-    try:
-        series = pd.read_json(url, typ='series')
-    except IOError:
+def get_response(ds):
+    if ds is None:
         print('Server is not responding')
-        return None
-    return series
+    return ds
 
 def print_data(data, msg):
     if data:
@@ -63,7 +163,34 @@ def print_data(data, msg):
         return True
     return False
 
+def load_test(requests=1000, threads=4, directory='.'):
+    """ Starts the server in a background thread and prints the number of
+        rescan requests per second it has handled.
+    """
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    import week29_server
+
+    # HTTP/1.1 lets the server keep connections alive
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    server = make_server(HOST, 0, week29_server.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    local = Client(HOST, server.server_port)
+    if local.scan(directory)['status'] != 0:
+        print(f'Unable to scan: {directory}')
+        server.shutdown()
+        return
+    start = time.perf_counter()
+    responses = local.batch('rescan', [directory] * requests, threads)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for ds in responses if ds is None or ds['status'] != 0)
+    print(f'{requests} requests, {threads} threads: {elapsed:.2f}s, '
+          f'{requests / elapsed:.0f} requests/s, {failed} failed')
+    local.close()
+    server.shutdown()
 
-if __name__ == '__main__':
-    main_loop()
 
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'load':
+        load_test(*[int(arg) for arg in sys.argv[2:4]], *sys.argv[4:5])
+    else:
+        main_loop()
@@ -21,54 +21,172 @@ format:
     "timestamp": " ... "
 }
 Only "message", "pathaname" and "status" are always present, the status number
-indicates whether the command was completed successfuly (status 0) or an error
-has occured (status < 0). The message string contains the description of the
-response, the pathname string the name of the processed directory. The "data"
-object, if present, is composed of 3 arrays: "added", "changed" and "removed",
-each of them lists the names of added, changed or deleted files. The "timestamp"
-strings shows the date and time when the directory was last scanned, it is 
-present only when the status is 0.
+indicates whether the command was completed successfuly (status 0), is still
+being processed (status 1) or an error has occured (status < 0). The message
+string contains the description of the response, the pathname string the name
+of the processed directory. The "data" object, if present, is composed of
+3 arrays: "added", "changed" and "removed", each of them lists the names of
+added, changed or deleted files. The "timestamp" strings shows the date and
+time when the directory was last scanned, it is present only when the status
+is 0.
+
+The server keeps recently used snapshots in memory, the least recently used
+ones are evicted when more than CACHE_SIZE directories are cached. Snapshots of
+directories scanned by this server are kept up to date by inotify watchers
+(where available), so their rescans are answered without walking the directory.
+
+Large directories can be processed in the background with:
+    http://127.0.0.1:5000/submit/scan/?<directory_name>
+    http://127.0.0.1:5000/submit/rescan/?<directory_name>
+both commands respond immediately with the "job" number and status 1. The state
+of the job is reported by:
+    http://127.0.0.1:5000/status/?<job>
+where the "progress" object shows the numbers of processed "files" and hashed
+"bytes". The status stays 1 while the job is running, when it has finished the
+response is the same as for the synchronous command (status 0 or less).
 """
 import os
 import time
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from os.path import isdir
 from flask import Flask, request, jsonify
 from week26 import FileInfo, FileList, DirectoryFileError
+from week26_watch import DirectoryWatcher
 
 PICKLE_STORE = '/tmp/'
+CACHE_SIZE = 16         # maximal number of snapshots kept in memory
+JOB_WORKERS = 2         # number of background scans run at the same time
+MAX_JOBS = 1000         # finished jobs kept for status requests
 app = Flask(__name__)
+# directory -> (FileList object, DirectoryWatcher object or None)
+cache = OrderedDict()
+cache_lock = threading.Lock()
+# job number -> dictionary describing the job
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+job_numbers = itertools.count(1)
+executor = ThreadPoolExecutor(JOB_WORKERS)
 
 @app.route('/scan/')    # both: /scan and /scan/ are accepted
 def scan_dir():
-    pathname = get_pathname()
+    return jsonify(do_scan(get_pathname()))
+
+@app.route('/rescan/')
+def rescan_dir():
+    return jsonify(do_rescan(get_pathname()))
+
+@app.route('/submit/scan/')
+def submit_scan():
+    return submit(do_scan, get_pathname())
+
+@app.route('/submit/rescan/')
+def submit_rescan():
+    return submit(do_rescan, get_pathname())
+
+@app.route('/status/')
+def job_status():
+    job_id = request.query_string.decode('utf-8')
+    with jobs_lock:
+        job = jobs.get(job_id)
+    if job is None:
+        return get_json(-4, '', f'Unknown job: {job_id}')
+    if job['result'] is None:
+        response = get_dict(1, job['pathname'], 'Job is running')
+    else:
+        response = dict(job['result'])
+    response['job'] = job_id
+    response['progress'] = {'files': job['files'], 'bytes': job['bytes']}
+    return jsonify(response)
+
+def do_scan(pathname, progress=None):
     try:
-        scan_data = FileList(pathname)
+        scan_data = FileList(pathname, progress=progress)
     except DirectoryFileError as e:
-        return get_json(-1, pathname, 
+        return get_dict(-1, pathname, 
                 f'Directory does not exist or can not be read. {str(e)}')
     try:
         out_file = file_name(scan_data.directory)
         scan_data.store(out_file)
     except DirectoryFileError as e:
-        return get_json(-3, out_file, f'Data store error. {str(e)}')
-    return get_json(0, scan_data.directory,
+        return get_dict(-3, out_file, f'Data store error. {str(e)}')
+    watcher = DirectoryWatcher(scan_data)
+    if watcher.mode == 'inotify':
+        watcher.start()
+    else:
+        # polling a large directory would keep the server busy all the time
+        watcher.stop()
+        watcher = None
+    cache_put(scan_data.directory, scan_data, watcher)
+    return get_dict(0, scan_data.directory,
                 'Directory scanned and gathered data saved.',
-                get_timestamp(scan_data))
+                get_timestamp(scan_data.timestamp))
 
-@app.route('/rescan/')
-def rescan_dir():
-    pathname = os.path.abspath(get_pathname())
-    if isdir(pathname) and os.access(pathname, os.R_OK):
+def do_rescan(pathname, progress=None):
+    pathname = os.path.abspath(pathname)
+    if not (isdir(pathname) and os.access(pathname, os.R_OK)):
+        return get_dict(-1, pathname, 
+                f'Directory: {pathname} does not exist or can not be read.')
+    entry = cache_get(pathname)
+    if entry is None:
         try:
-            scan_data = FileList(file_name(pathname))
+            entry = (FileList(file_name(pathname)), None)
         except DirectoryFileError as e:
-            return get_json(-2, pathname, f'Directory not scanned yet. {str(e)}')
+            return get_dict(-2, pathname, f'Directory not scanned yet. {str(e)}')
+        cache_put(pathname, *entry)
+    scan_data, watcher = entry
+    if watcher is not None:
+        # changes are always reported since the scan
+        diffs = watcher.rescan(reset=False)
     else:
-        return get_json(-1, pathname, 
-                f'Directory: {pathname} does not exist or can not be read.')
-    diffs = scan_data.rescan()
-    return get_json(0, pathname, 'Changes in directory since last scan',
-            get_timestamp(scan_data), diffs)
+        diffs = {'added': [], 'removed': [], 'changed': []}
+        for kind, filepath in scan_data.compare(fast=True, progress=progress):
+            diffs[kind].append(filepath)
+    return get_dict(0, pathname, 'Changes in directory since last scan',
+            get_timestamp(time.time()), diffs)
+
+def submit(command, pathname):
+    job_id = str(next(job_numbers))
+    job = {'pathname': pathname, 'files': 0, 'bytes': 0, 'result': None}
+    with jobs_lock:
+        jobs[job_id] = job
+        finished = [key for key, value in jobs.items()
+                    if value['result'] is not None]
+        for key in finished[:max(0, len(jobs) - MAX_JOBS)]:
+            del jobs[key]
+    executor.submit(run_job, job, command)
+    response = get_dict(1, pathname, 'Job submitted')
+    response['job'] = job_id
+    return jsonify(response)
+
+def run_job(job, command):
+    def progress(info):
+        job['files'] += 1
+        if info.hashed:
+            job['bytes'] += info.signature[1]   # size of the file
+    try:
+        job['result'] = command(job['pathname'], progress)
+    except Exception as e:
+        job['result'] = get_dict(-5, job['pathname'], f'Job failed. {str(e)}')
+
+def cache_get(directory):
+    with cache_lock:
+        entry = cache.get(directory)
+        if entry is not None:
+            cache.move_to_end(directory)
+        return entry
+
+def cache_put(directory, scan_data, watcher):
+    with cache_lock:
+        evicted = [cache.pop(directory, None)]
+        cache[directory] = (scan_data, watcher)
+        while len(cache) > CACHE_SIZE:
+            evicted.append(cache.popitem(last=False)[1])
+    for entry in evicted:
+        if entry is not None and entry[1] is not None:
+            entry[1].stop()
 
 def get_pathname():
     pathname = request.query_string.decode('utf-8')
@@ -79,10 +197,10 @@ def get_pathname():
 def file_name(name):
     return PICKLE_STORE + name.replace('/', '-')
 
-def get_timestamp(scanned):
-    return f'{time.strftime("%d %b %Y %H:%M:%S", time.localtime(scanned.timestamp))}'
+def get_timestamp(seconds):
+    return f'{time.strftime("%d %b %Y %H:%M:%S", time.localtime(seconds))}'
 
-def get_json(status, pathname, message, timestamp=None, data=None):
+def get_dict(status, pathname, message, timestamp=None, data=None):
     response = {}
     response['status'] = status
     response['pathname'] = pathname
@@ -91,8 +209,10 @@ def get_json(status, pathname, message, timestamp=None, data=None):
         response['timestamp'] = timestamp
     if data is not None:
         response['data'] = data
-    return jsonify(response)
+    return response
+
+def get_json(status, pathname, message, timestamp=None, data=None):
+    return jsonify(get_dict(status, pathname, message, timestamp, data))
 
 if __name__ == '__main__':
     app.run(debug=True)
-
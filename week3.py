@@ -1,13 +1,174 @@
+import os
 import re
+import gzip
+from concurrent.futures import ProcessPoolExecutor
 
-def process_log_file(file_name):
-    pattern = r'(?P<ip_address>[\d\.]+) - - \[(?P<timestamp>.+)\] "(?P<request>GET .+?)"'
-    log_data = []
-    with open(file_name, 'r') as log_file:
+BUFSIZE = 1048576   # 1MB read buffer
+CHUNKS = 4          # number of byte ranges per worker, balances the load
+PATTERN = r'(?P<ip_address>[\d\.]+) - - \[(?P<timestamp>.+)\] "(?P<request>GET .+?)"'
+COMMON = (r'(?P<ip_address>\S+) \S+ \S+ \[(?P<timestamp>[^\]]+)\] '
+          r'"(?P<request>[^"]*)" (?P<status>\d{3}) (?P<size>\S+)')
+# registry of log formats: name -> regular expression with named groups
+FORMATS = {'get': PATTERN,
+           'common': COMMON,
+           'combined': COMMON + r' "(?P<referer>[^"]*)" "(?P<user_agent>[^"]*)"'}
+_compiled = {}      # regular expression -> compiled pattern object
+
+def compiled(pattern):
+    """Returns the compiled pattern object, every pattern is compiled once."""
+    regex = _compiled.get(pattern)
+    if regex is None:
+        regex = _compiled[pattern] = re.compile(pattern)
+    return regex
+
+def register_format(name, pattern):
+    """Adds a custom log format, the pattern must use named groups."""
+    FORMATS[name] = pattern
+
+class LogParser:
+    """Parses log lines in one of the registered FORMATS (or matching a custom
+    pattern) into dictionaries of named groups. For the common and combined
+    formats, when split is True, the fields are first extracted with string
+    methods and the regular expression is used only if this fails. Measured
+    with CPython 3.11 the precompiled regular expression is faster, therefore
+    it is the default.
+    """
+
+    def __init__(self, log_format='get', pattern=None, split=False):
+        if pattern is None:
+            pattern = FORMATS[log_format]
+        self.regex = compiled(pattern)
+        self.split = None
+        if split and pattern == FORMATS['common']:
+            self.split = self._split_common
+        elif split and pattern == FORMATS['combined']:
+            self.split = self._split_combined
+
+    def parse(self, line):
+        """Returns the dictionary of fields or None if the line does not match
+        the format.
+        """
+        if self.split is not None:
+            fields = self.split(line)
+            if fields is not None:
+                return fields
+        matching = self.regex.match(line)
+        return None if matching is None else matching.groupdict()
+
+    @staticmethod
+    def _split(line):
+        """Returns fields of the line in the common format and the rest of the
+        line after them, or None if the line is not simple enough for string
+        methods.
+        """
+        head, found, rest = line.partition(' [')
+        if not found or head.count(' ') != 2 or head[0] == ' ':
+            return None
+        timestamp, found, rest = rest.partition('] "')
+        if not found or not timestamp or ']' in timestamp:
+            return None
+        request, found, rest = rest.partition('" ')
+        if not found or '"' in request:
+            return None
+        status, found, rest = rest.partition(' ')
+        size, found, rest = rest.partition(' ')
+        size = size.rstrip('\r\n')
+        if len(status) != 3 or not status.isdigit() or not size:
+            return None
+        return ({'ip_address': head[:head.index(' ')], 'timestamp': timestamp,
+                 'request': request, 'status': status, 'size': size}, rest)
+
+    @classmethod
+    def _split_common(cls, line):
+        split = cls._split(line)
+        return None if split is None else split[0]
+
+    @classmethod
+    def _split_combined(cls, line):
+        split = cls._split(line)
+        if split is None:
+            return None
+        fields, rest = split
+        # the rest should start with: "referer" "user agent"
+        quoted = rest.split('"')
+        if len(quoted) < 5 or quoted[0] or quoted[2] != ' ':
+            return None
+        fields['referer'] = quoted[1]
+        fields['user_agent'] = quoted[3]
+        return fields
+
+def open_log(file_name):
+    """Opens the log file for reading text in large buffered chunks, files
+    compressed with gzip (e.g. rotated logs) are decompressed on the fly.
+    """
+    with open(file_name, 'rb') as log_file:
+        compressed = log_file.read(2) == b'\x1f\x8b'
+    if compressed:
+        return gzip.open(file_name, 'rt')
+    return open(file_name, 'r', buffering=BUFSIZE)
+
+def parse_line(line):
+    return compiled(PATTERN).match(line).groupdict()
+
+def iter_log_file(file_name, parser=None):
+    """Generates dictionaries for the lines of the log without keeping the
+    file in memory. The optional parser is a LogParser object, the lines not
+    matching its format are represented by None.
+    """
+    parse = parse_line if parser is None else parser.parse
+    with open_log(file_name) as log_file:
         for line in log_file:
-            matching = re.match(pattern, line)
-            log_data.append(matching.groupdict())
-    return log_data
+            yield parse(line)
+
+def process_log_file(file_name, parser=None):
+    return list(iter_log_file(file_name, parser))
+
+def byte_ranges(file_name, parts):
+    """Splits the file into at most parts (start, end) byte ranges, every one
+    of them begins at the beginning of a line.
+    """
+    size = os.path.getsize(file_name)
+    bounds = [0]
+    with open(file_name, 'rb') as log_file:
+        for part in range(1, parts):
+            log_file.seek(size * part // parts)
+            log_file.readline()     # move to the beginning of the next line
+            if log_file.tell() > bounds[-1]:
+                bounds.append(log_file.tell())
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def parse_range(file_name, start, end, parse=parse_line):
+    """Returns the list of results of parse for the lines within the range."""
+    out = []
+    with open(file_name, 'rb', buffering=BUFSIZE) as log_file:
+        log_file.seek(start)
+        position = start
+        while position < end:
+            line = log_file.readline()
+            position += len(line)
+            out.append(parse(line.decode()))
+    return out
+
+def process_log_file_parallel(file_name, workers=None, parse=parse_line):
+    """Works like process_log_file, but the file is split into byte ranges
+    parsed by a pool of worker processes, the results are merged in the
+    original order. The parse function is applied to every line, it must be
+    defined at the top level of a module. Compressed files can not be split
+    and are parsed sequentially.
+    """
+    with open(file_name, 'rb') as log_file:
+        compressed = log_file.read(2) == b'\x1f\x8b'
+    if compressed:
+        with open_log(file_name) as log_file:
+            return [parse(line) for line in log_file]
+    workers = workers or os.cpu_count()
+    ranges = byte_ranges(file_name, workers * CHUNKS)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(parse_range, file_name, start, end, parse)
+                   for start, end in ranges]
+        return [entry for future in futures for entry in future.result()]
 
 
 if __name__ == '__main__':
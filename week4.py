@@ -1,31 +1,396 @@
+import os
 import re
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from datetime import datetime
+from functools import lru_cache
+from week3 import open_log, process_log_file_parallel
+try:
+    import numpy as np
+except ImportError:     # aggregations fall back to collections.Counter
+    np = None
+
+NO_TIME = -2**63    # epoch value of the lines without a valid timestamp
+# compiled once, used for every line by LogDicts._line_to_dict
+LINE_PATTERN = re.compile(r'''
+    # IP addresses contain four numbers (each with 1-3 digits)
+        (?P<ip_address>(?:\d{1,3}\.){3}\d{1,3}) 
+    # Junk between IP address and timestamp
+        .*
+    # Timestamp, defined to be anything between [ and ]
+        \[(?P<timestamp>[^\]]+)\]
+    # Junk between timestamp and request
+        .*
+    # Request, starting with GET
+        "(?P<request>GET[^"]+)"                 
+    ''', re.X)
+
+@lru_cache(maxsize=1024)
+def _day_epoch(day, zone):
+    """Returns the epoch seconds of the midnight of the day in the time zone."""
+    return int(datetime.strptime(f'{day} {zone}', '%d/%b/%Y %z').timestamp())
+
+def parse_time(timestamp):
+    """Returns the epoch seconds for the timestamp in the Apache log format:
+    30/Jan/2010:00:03:18 +0200. Only the date and time zone part goes through
+    strptime and it is cached, because millions of log lines share the same
+    day. Raises ValueError for invalid timestamps.
+    """
+    if (len(timestamp) != 26 or timestamp[11] != ':' or timestamp[14] != ':'
+            or timestamp[17] != ':' or timestamp[20] != ' '):
+        raise ValueError(f'Invalid timestamp: {timestamp}')
+    hours, minutes, seconds = (int(timestamp[12:14]), int(timestamp[15:17]),
+                               int(timestamp[18:20]))
+    if hours > 23 or minutes > 59 or seconds > 59:
+        raise ValueError(f'Invalid timestamp: {timestamp}')
+    return (_day_epoch(timestamp[:11], timestamp[21:]) +
+            hours * 3600 + minutes * 60 + seconds)
+
+def to_epoch(moment):
+    """Converts datetime object (naive ones are in the local time) or a number
+    of seconds into integer epoch seconds.
+    """
+    if isinstance(moment, datetime):
+        return int(moment.timestamp())
+    return int(moment)
+
+def request_path(request):
+    """Returns the path part of the request, e.g. /index.html of
+    GET /index.html HTTP/1.1
+    """
+    parts = request.split()
+    return parts[1] if len(parts) > 1 else request
+
+class LogColumns:
+    """Parsed log lines kept column by column: IP addresses, timestamps (as in
+    the log and as epoch seconds) and requests. Every distinct IP address and
+    request is stored only once and the columns keep their integer ids.
+    Repeating timestamps are interned.
+    """
+
+    def __init__(self):
+        self.ip_ids = array('l')
+        self.ip_names = []          # id -> IP address
+        self._ip_id = {}            # IP address -> id
+        self.timestamps = []
+        self.epochs = array('q')
+        self.request_ids = array('l')
+        self.request_names = []     # id -> request
+        self._request_id = {}       # request -> id
+        self._ordered = None    # are the epochs in non-decreasing order?
+
+    def __len__(self):
+        return len(self.ip_ids)
+
+    @staticmethod
+    def _get_id(name, names, ids):
+        idx = ids.get(name)
+        if idx is None:
+            idx = ids[name] = len(names)
+            names.append(name)
+        return idx
+
+    def append(self, entry):
+        """Adds the dictionary produced by LogDicts._line_to_dict."""
+        timestamp = sys.intern(entry['timestamp'])
+        try:
+            epoch = parse_time(timestamp)
+        except ValueError:
+            epoch = NO_TIME
+        self._ordered = None
+        self.ip_ids.append(self._get_id(entry['ip_address'], self.ip_names,
+                                        self._ip_id))
+        self.timestamps.append(timestamp)
+        self.epochs.append(epoch)
+        self.request_ids.append(self._get_id(entry['request'],
+                                             self.request_names,
+                                             self._request_id))
+
+    def row(self, idx):
+        """Returns the dictionary describing the line number idx."""
+        return {'ip_address': self.ip_names[self.ip_ids[idx]],
+                'timestamp': self.timestamps[idx],
+                'request': self.request_names[self.request_ids[idx]]}
+
+    def rows_for_ip(self, ip_address):
+        """Returns positions of lines with the IP address."""
+        wanted = self._ip_id.get(ip_address)
+        ids = self.ip_ids
+        return [idx for idx in range(len(ids)) if ids[idx] == wanted]
+
+    def rows_for_request(self, text):
+        """Returns positions of lines with requests containing text, every
+        distinct request is checked only once.
+        """
+        wanted = {idx for idx, request in enumerate(self.request_names)
+                  if text in request}
+        ids = self.request_ids
+        return [idx for idx in range(len(ids)) if ids[idx] in wanted]
+
+    def counts(self, field):
+        """Returns Counter of the numbers of lines for every value of the field:
+        'ip_address', 'request' or 'path' (of the request).
+        """
+        if field == 'ip_address':
+            ids, names = self.ip_ids, self.ip_names
+        else:
+            ids, names = self.request_ids, self.request_names
+        if np is not None:
+            per_id = np.bincount(np.frombuffer(ids, f'i{ids.itemsize}'),
+                                 minlength=len(names)).tolist()
+        else:
+            found = Counter(ids)
+            per_id = [found[idx] for idx in range(len(names))]
+        out = Counter()
+        if field == 'path':
+            for idx, count in enumerate(per_id):
+                if count:
+                    out[request_path(names[idx])] += count
+        else:
+            out.update({names[idx]: count for idx, count in enumerate(per_id)
+                        if count})
+        return out
+
+    def histogram(self, bucket):
+        """Returns Counter of the numbers of lines logged in every time bucket,
+        keyed by epoch seconds of the bucket's beginning.
+        """
+        if np is not None:
+            epochs = np.frombuffer(self.epochs, dtype=np.int64)
+            starts, counts = np.unique(epochs[epochs != NO_TIME] // bucket,
+                                       return_counts=True)
+            return Counter(dict(zip((starts * bucket).tolist(),
+                                    counts.tolist())))
+        return Counter(epoch // bucket * bucket for epoch in self.epochs
+                       if epoch != NO_TIME)
+
+    def rows_between(self, start, end):
+        """Returns positions of lines with epochs from start to end, inclusive.
+        Binary search is used when the lines are in the time order.
+        """
+        epochs = self.epochs
+        if self._ordered is None:
+            self._ordered = all(epochs[idx] <= epochs[idx + 1]
+                                for idx in range(len(epochs) - 1))
+        if self._ordered:
+            return range(bisect_left(epochs, start), bisect_right(epochs, end))
+        return [idx for idx in range(len(epochs))
+                if start <= epochs[idx] <= end]
+
+class FrequentItems:
+    """Approximate counting of the most frequent items in a stream, using at
+    most capacity counters (Misra-Gries summary). Every item occurring more
+    than n / (capacity + 1) times in n items is kept, its count may be lower
+    than the real one by at most that much.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, item):
+        counts = self.counts
+        if item in counts:
+            counts[item] += 1
+        elif len(counts) < self.capacity:
+            counts[item] = 1
+        else:
+            # each decrement cancels a previous increment, so this loop costs
+            # constant time per item on average
+            for key in list(counts):
+                if counts[key] == 1:
+                    del counts[key]
+                else:
+                    counts[key] -= 1
+
+    def most_common(self, k):
+        return Counter(self.counts).most_common(k)
+
+class LogIndex:
+    """Secondary indexes of log lines: positions of lines for every IP address
+    and for every distinct request, together with an index of words (tokens)
+    found in requests, used for finding requests containing a given text.
+    """
+
+    def __init__(self):
+        self.ip_rows = {}           # IP address -> list of line positions
+        self.request_rows = {}      # request -> list of line positions
+        self.token_requests = {}    # token -> set of requests containing it
+
+    def add(self, idx, ip_address, request):
+        """Adds the line at position idx, positions must be increasing."""
+        self.ip_rows.setdefault(ip_address, []).append(idx)
+        rows = self.request_rows.get(request)
+        if rows is None:
+            rows = self.request_rows[request] = []
+            for token in re.findall(r'\w+', request):
+                self.token_requests.setdefault(token, set()).add(request)
+        rows.append(idx)
+
+    def rows_for_ip(self, ip_address):
+        return self.ip_rows.get(ip_address, [])
+
+    def rows_for_request(self, text):
+        """Returns sorted positions of lines with requests containing text."""
+        words = list(re.finditer(r'\w+', text))
+        candidates = None
+        for word in words:
+            # a word touching the edge of the text may be a part of a longer
+            # token, then all tokens containing it have to be considered
+            whole = word.start() > 0 and word.end() < len(text)
+            if whole:
+                requests = self.token_requests.get(word.group(), set())
+            else:
+                requests = set().union(*(found for token, found
+                                         in self.token_requests.items()
+                                         if word.group() in token))
+            candidates = (requests if candidates is None
+                          else candidates & requests)
+        if candidates is None:      # text without any words
+            candidates = self.request_rows
+        rows = [self.request_rows[request] for request in candidates
+                if text in request]
+        if len(rows) == 1:
+            return rows[0]
+        return sorted(idx for one_request in rows for idx in one_request)
 
 class LogDicts:
 
-    def __init__(self, filename):
-        self._log_lines = self._load_file(filename)
+    def __init__(self, filename, columnar=False, indexed=False, workers=None,
+                 follow=False):
+        """In the columnar mode the file is parsed only once, when the object
+        is created, and all queries are served from LogColumns. When workers
+        is given, the file is parsed by that many processes, this implies
+        the columnar mode. When indexed is True, LogIndex is built with the
+        first for_ip or for_request call and used by all these calls. In the
+        follow mode the file is kept open and the refresh method adds lines
+        appended to it later on, workers are not used then.
+        """
+        self._columns = None
+        self._index = None
+        self.indexed = indexed
+        self.filename = filename
+        self._follow_file = None
+        if follow:
+            self._follow_file = open(filename, 'rb')
+            if self._follow_file.read(2) == b'\x1f\x8b':
+                self._follow_file.close()
+                raise ValueError(f'Compressed log can not be followed: {filename}')
+            self._follow_file.seek(0)
+            self._log_lines = self._read_new_lines()
+        elif workers:
+            self._log_lines = None
+            self._columns = LogColumns()
+            for entry in process_log_file_parallel(filename, workers,
+                                                   self._line_to_dict):
+                self._columns.append(entry)
+        else:
+            self._log_lines = self._load_file(filename)
+        if columnar and self._columns is None:
+            self._columns = LogColumns()
+            for line in self._log_lines:
+                self._columns.append(self._line_to_dict(line))
+            self._log_lines = None
         self.earliest_dict = None
         self.latest_dict = None
 
     def _load_file(self, filename):
-        with open(filename) as f:
+        with open_log(filename) as f:
             return f.readlines()
 
-    def _line_to_dict(self, line):
-        pattern = r'''
-        # IP addresses contain four numbers (each with 1-3 digits)
-            (?P<ip_address>(?:\d{1,3}\.){3}\d{1,3}) 
-        # Junk between IP address and timestamp
-            .*
-        # Timestamp, defined to be anything between [ and ]
-            \[(?P<timestamp>[^\]]+)\]
-        # Junk between timestamp and request
-            .*
-        # Request, starting with GET
-            "(?P<request>GET[^"]+)"                 
-        '''
-        match = re.search(pattern, line, re.X)
+    def _read_new_lines(self):
+        """Returns complete lines appended to the followed file since the last
+        reading, an incomplete last line is left for later.
+        """
+        data = self._follow_file.read()
+        complete = data.rfind(b'\n') + 1
+        self._follow_file.seek(complete - len(data), os.SEEK_CUR)
+        # only newlines end lines, str.splitlines would split them also at
+        # e.g. \x0c or \u2028 found within requests or user agents
+        return [line.decode() + '\n'
+                for line in data[:complete].split(b'\n')[:-1]]
+
+    def _rotated(self):
+        """Checks if the followed file was replaced (e.g. by log rotation) or
+        truncated.
+        """
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:   # new file not created yet
+            return False
+        return (stat.st_ino != os.fstat(self._follow_file.fileno()).st_ino or
+                stat.st_size < self._follow_file.tell())
+
+    def refresh(self):
+        """Adds the lines appended to the followed log since the last refresh,
+        after rotation of the log the new file is read from the beginning.
+        Cached latest and earliest entries and indexes are updated. Returns
+        the number of added lines.
+        """
+        if self._follow_file is None:
+            return 0
+        lines = self._read_new_lines()
+        if self._rotated():
+            # remaining lines of the old file are read above already
+            self._follow_file.close()
+            self._follow_file = open(self.filename, 'rb')
+            lines.extend(self._read_new_lines())
+        if not lines:
+            return 0
+        if self._columns is None:
+            first = len(self._log_lines)
+            self._log_lines.extend(lines)
+        else:
+            first = len(self._columns)
+            for line in lines:
+                self._columns.append(self._line_to_dict(line))
+        for idx, entry in enumerate(self._rows(range(first, first + len(lines))),
+                                    first):
+            if self._index is not None:
+                self._index.add(idx, entry['ip_address'], entry['request'])
+            self._update_extremes(entry)
+        return len(lines)
+
+    def _update_extremes(self, entry):
+        """Updates cached latest and earliest entries with the new entry."""
+        try:
+            moment = self._time_convert(entry)
+        except ValueError:
+            return
+        if (self.latest_dict is not None and
+                moment >= self._time_convert(self.latest_dict)):
+            self.latest_dict = entry
+        if (self.earliest_dict is not None and
+                moment < self._time_convert(self.earliest_dict)):
+            self.earliest_dict = entry
+
+    def follow(self, interval=1.0):
+        """Generates dictionaries of lines appended to the followed log, like
+        tail -f, checking the file every interval seconds.
+        """
+        while True:
+            count = self.refresh()
+            if count:
+                if self._columns is None:
+                    total = len(self._log_lines)
+                else:
+                    total = len(self._columns)
+                yield from self._rows(range(total - count, total))
+            else:
+                time.sleep(interval)
+
+    def close(self):
+        """Closes the followed file."""
+        if self._follow_file is not None:
+            self._follow_file.close()
+            self._follow_file = None
+
+    @staticmethod   # picklable by name, so worker processes can use it
+    def _line_to_dict(line):
+        match = LINE_PATTERN.search(line)
         if match:
             output = match.groupdict()
         else:
@@ -40,47 +405,202 @@ class LogDicts:
         else:
             return obj
     
+    def _rows(self, indices=None):
+        """Generates dictionaries of all lines or of lines given by indices."""
+        if self._columns is None and indices is None:
+            return (self._line_to_dict(line) for line in self._log_lines)
+        if self._columns is None:
+            return (self._line_to_dict(self._log_lines[idx])
+                    for idx in indices)
+        if indices is None:
+            indices = range(len(self._columns))
+        return (self._columns.row(idx) for idx in indices)
+
     def iterdicts(self, key=None):
-        out = (self._line_to_dict(line) for line in self._log_lines)
+        out = self._rows()
         return self._sorting_choice(out, key)
 
     def dicts(self, key=None):
-        out = [self._line_to_dict(line) for line in self._log_lines]
+        out = list(self._rows())
         if key:
             return sorted(out, key=key)
         else:
             return out
 
     def _time_convert(self, entry):
-        return datetime.strptime(entry['timestamp'], '%d/%b/%Y:%H:%M:%S %z')   
+        return parse_time(entry['timestamp'])
+
+    def between(self, start, end, key=None):
+        """Generates dictionaries of entries logged from start to end,
+        inclusive. Both instants are datetime objects or epoch seconds. Lines
+        without a valid timestamp are skipped.
+        """
+        start, end = to_epoch(start), to_epoch(end)
+        if self._columns is not None:
+            out = self._rows(self._columns.rows_between(start, end))
+        else:
+            out = (entry for entry in self._rows()
+                   if self._valid_between(entry, start, end))
+        return self._sorting_choice(out, key)
+
+    def _valid_between(self, entry, start, end):
+        try:
+            return start <= self._time_convert(entry) <= end
+        except ValueError:
+            return False
 
     def latest(self):
-        if self.latest_dict is None:
-            idx = max((self._time_convert(entry), idx)
-                      for idx, entry in enumerate(self.iterdicts()))[1]
-            self.latest_dict = [self._line_to_dict(line) 
-                                for line in self._log_lines][idx]
+        if self.latest_dict is None and self._columns is not None:
+            epochs = self._columns.epochs
+            # the last one of the latest entries, as below
+            latest = max(epochs)
+            idx = len(epochs) - 1 - epochs[::-1].index(latest)
+            self.latest_dict = self._columns.row(idx)
+        elif self.latest_dict is None:
+            self.latest_dict = max(self._timed_entries(),
+                                   default=(None, None, None))[2]
         return self.latest_dict
 
     def earliest(self):
-        if self.earliest_dict is None:
-            idx = min((self._time_convert(entry), idx)
-                      for idx, entry in enumerate(self.iterdicts()))[1]
-            self.earliest_dict = [self._line_to_dict(line) 
-                                for line in self._log_lines][idx]
+        if self.earliest_dict is None and self._columns is not None:
+            epochs = self._columns.epochs
+            earliest = min((epoch for epoch in epochs if epoch != NO_TIME),
+                           default=NO_TIME)
+            self.earliest_dict = self._columns.row(epochs.index(earliest))
+        elif self.earliest_dict is None:
+            self.earliest_dict = min(self._timed_entries(),
+                                     default=(None, None, None))[2]
         return self.earliest_dict
 
+    def _timed_entries(self):
+        """Generates (epoch, index, entry) of lines with a valid timestamp,
+        unique indices assure that dictionaries are never compared.
+        """
+        for idx, entry in enumerate(self._rows()):
+            try:
+                yield self._time_convert(entry), idx, entry
+            except ValueError:
+                continue
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = LogIndex()
+            for idx, entry in enumerate(self._rows()):
+                self._index.add(idx, entry['ip_address'], entry['request'])
+        return self._index
+
     def for_ip(self, ip_address, key=None):
-        out = (self._line_to_dict(line) for line in self._log_lines 
-               if self._line_to_dict(line)['ip_address'] == ip_address)
+        if self.indexed:
+            out = self._rows(self._get_index().rows_for_ip(ip_address))
+            return self._sorting_choice(out, key)
+        if self._columns is not None:
+            out = self._rows(self._columns.rows_for_ip(ip_address))
+            return self._sorting_choice(out, key)
+        out = (entry for entry in self._rows()
+               if entry['ip_address'] == ip_address)
         return self._sorting_choice(out, key)
 
     def for_request(self, text, key=None):
-        out = (self._line_to_dict(line) for line in self._log_lines 
-               if text in self._line_to_dict(line)['request'])
+        if self.indexed:
+            out = self._rows(self._get_index().rows_for_request(text))
+            return self._sorting_choice(out, key)
+        if self._columns is not None:
+            out = self._rows(self._columns.rows_for_request(text))
+            return self._sorting_choice(out, key)
+        out = (entry for entry in self._rows()
+               if text in entry['request'])
         return self._sorting_choice(out, key)
 
+    def _field_values(self, field):
+        if field == 'path':
+            return (request_path(entry['request']) for entry in self._rows())
+        return (entry[field] for entry in self._rows())
 
+    def count(self, field='ip_address'):
+        """Returns Counter of the numbers of entries for every value of the
+        field: 'ip_address', 'request' or 'path' (of the request). In the
+        columnar mode the counting is done on ids of the values.
+        """
+        if self._columns is not None:
+            return self._columns.counts(field)
+        return Counter(self._field_values(field))
 
+    def top(self, field='ip_address', k=10, capacity=None):
+        """Returns a list of k most common values of the field together with
+        their counts. When capacity is given, no more than capacity values are
+        counted at a time with FrequentItems, so the memory use is bounded
+        even for millions of distinct values, but the counts are approximate.
+        """
+        if capacity is None:
+            return self.count(field).most_common(k)
+        summary = FrequentItems(capacity)
+        for value in self._field_values(field):
+            summary.add(value)
+        return summary.most_common(k)
 
+    def histogram(self, bucket=60):
+        """Returns a sorted list of (epoch seconds, count) tuples, the number
+        of entries logged in every time bucket of the given length in seconds.
+        Entries without a valid timestamp are skipped.
+        """
+        if self._columns is not None:
+            counts = self._columns.histogram(bucket)
+        else:
+            counts = Counter()
+            for entry in self._rows():
+                try:
+                    counts[self._time_convert(entry) // bucket * bucket] += 1
+                except ValueError:
+                    pass
+        return sorted(counts.items())
+
+class LogStream(LogDicts):
+    """LogDicts which does not keep the log in memory. Every query reads the
+    file again (gzip-compressed logs included) and parses its lines lazily,
+    only sorting by a key needs to hold the results. The earliest and latest
+    entries are found together in a single pass.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._follow_file = None
+        self._columns = None
+        self._index = None
+        self.indexed = False
+        self.earliest_dict = None
+        self.latest_dict = None
+
+    def _rows(self, indices=None):
+        with open_log(self.filename) as f:
+            for line in f:
+                yield self._line_to_dict(line)
+
+    def _find_extremes(self):
+        earliest = latest = None
+        previous = None
+        for entry in self._rows():
+            # consecutive lines often share the same timestamp
+            if entry['timestamp'] != previous:
+                previous = entry['timestamp']
+                try:
+                    moment = self._time_convert(entry)
+                except ValueError:
+                    moment = None
+            if moment is None:
+                continue
+            # the first one of the earliest and the last one of the latest
+            # entries, as in LogDicts
+            if earliest is None or moment < earliest:
+                earliest, self.earliest_dict = moment, entry
+            if latest is None or moment >= latest:
+                latest, self.latest_dict = moment, entry
 
+    def latest(self):
+        if self.latest_dict is None:
+            self._find_extremes()
+        return self.latest_dict
+
+    def earliest(self):
+        if self.earliest_dict is None:
+            self._find_extremes()
+        return self.earliest_dict
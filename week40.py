@@ -1,14 +1,17 @@
 """Simple TCP client - server application. This script must be executed with
-the argument either 's' or 'c', to start a server or a client, respectively.
-Only one client can be served at a time.
+the argument either 's', 'm' or 'c', to start a server, a multi-client server
+or a client, respectively. The server 's' can serve only one client at a time,
+the server 'm' serves many clients simultaneously.
 """
 
+import selectors
 import socket
 import sys
 
 ADDRESS = '127.0.0.1'   # server's IP address
 PORT = 9999             # server's port
 BUFSIZE = 1024          # size of the buffer for received data
+BACKLOG = 1024          # number of pending connections of the multi-client server
 
 class Server:
     """TCP server which understands just 3 commands.
@@ -17,8 +20,9 @@ class Server:
     from its controlling terminal and can be stopped by pressing Ctrl-C.
     """
 
-    def __init__(self, address, port):
+    def __init__(self, address, port, verbose=True):
 
+        self.verbose = verbose  # print the log of connections
         self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.my_socket.bind((address, port))
         self.conn = None
@@ -31,34 +35,42 @@ class Server:
     def run(self):
         """Runs the server and handles messages received from the client."""
        
-        print('Server started')
+        self._log('Server started')
         # after the client disconnets the new one can be served
         while True:
             self.my_socket.listen()
             self.conn, self.addr = self.my_socket.accept()
             # context manager assures that socket will be closed when finished
             with self.conn:
-                print(f'Accepted connection from {self.addr[0]} on port {self.addr[1]}')
+                self._log(f'Accepted connection from {self.addr[0]} on port {self.addr[1]}')
                 self.conn.sendall(b'Server is listening...')
                 # handling client - server exchanges 
                 while True:
-                    # first element of the list is command, second, if any, is payload
-                    data = self.conn.recv(BUFSIZE).decode('utf-8').split(' ', 1)
-                    if not data[0]:
-                        print('Client has crashed')
+                    received = self.conn.recv(BUFSIZE)
+                    if not received:
+                        self._log('Client has crashed')
+                        break
+                    if self._handle(received):
                         break
-                    if data[0] in self.cmd:
-                        # for a valid command make sure that list always has
-                        # second element
-                        data.append('')
-                        # all command processing methods return False, except
-                        # the method processing 'bye' command which returns
-                        # True, that terminates connection with the client
-                        if self.cmd[data[0]](data[1]):
-                            break
-                    else:
-                        self._unknown(data[0])
-            
+
+    def _handle(self, received):
+        """Processes the message received from the client, returns True if
+        the connection with the client should be terminated.
+        """
+
+        # first element of the list is command, second, if any, is payload,
+        # invalid bytes must not end the server (or the connection)
+        data = received.decode('utf-8', errors='replace').split(' ', 1)
+        if data[0] in self.cmd:
+            # for a valid command make sure that list always has second element
+            data.append('')
+            # all command processing methods return False, except the method
+            # processing 'bye' command which returns True, that terminates
+            # connection with the client
+            return self.cmd[data[0]](data[1])
+        self._unknown(data[0])
+        return False
+
     def _say(self, msg):
         """Sends an echo to the client."""
 
@@ -80,7 +92,7 @@ class Server:
         """Sends final good-bye to the client."""
 
         self.conn.sendall(b'bye')
-        print('Client has signed-off')
+        self._log('Client has signed-off')
         return True
 
     def _unknown(self, arg):
@@ -88,9 +100,111 @@ class Server:
 
         self.conn.sendall(f'Unknown command: {arg}'.encode('utf-8'))
 
+    def _log(self, msg):
+        if self.verbose:
+            print(msg)
+
     def close(self):
         self.my_socket.close()
-        
+
+
+class Connection:
+    """State of a client connection of the ConcurrentServer. Data passed to
+    sendall is only queued, the server sends it when the socket is writable.
+    """
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.outgoing = bytearray()
+        self.closing = False    # close after all queued data is sent
+
+    def sendall(self, data):
+        self.outgoing += data
+
+
+class ConcurrentServer(Server):
+    """TCP server which understands the same commands as Server, but serves
+    many clients simultaneously in a single thread.
+
+    Non-blocking sockets of all clients are watched by a selector, so the
+    server reads from a client only when its message has arrived and writes
+    only when the socket can accept more data. As for Server, every received
+    chunk of data is a single command, because clients wait for the response
+    before sending the next one.
+    """
+
+    def __init__(self, address, port, verbose=True):
+        super().__init__(address, port, verbose)
+        self.selector = selectors.DefaultSelector()
+
+    def run(self):
+        """Runs the event loop of the server."""
+
+        self.my_socket.listen(BACKLOG)
+        self.my_socket.setblocking(False)
+        self.selector.register(self.my_socket, selectors.EVENT_READ)
+        self._log('Server started')
+        while True:
+            for key, mask in self.selector.select():
+                if key.data is None:
+                    self._accept()
+                else:
+                    self._serve(key.data, mask)
+
+    def _accept(self):
+        """Accepts the new client and queues the initial message."""
+
+        try:
+            sock, addr = self.my_socket.accept()
+        except BlockingIOError:
+            return
+        self._log(f'Accepted connection from {addr[0]} on port {addr[1]}')
+        sock.setblocking(False)
+        conn = Connection(sock, addr)
+        conn.sendall(b'Server is listening...')
+        self.selector.register(sock, selectors.EVENT_WRITE, conn)
+
+    def _serve(self, conn, mask):
+        """Handles the events of the client socket."""
+
+        try:
+            if mask & selectors.EVENT_READ:
+                received = conn.sock.recv(BUFSIZE)
+                if not received:
+                    self._log('Client has crashed')
+                    self._disconnect(conn)
+                    return
+                # command processing methods send responses through self.conn
+                self.conn = conn
+                conn.closing = self._handle(received)
+            if mask & selectors.EVENT_WRITE and conn.outgoing:
+                sent = conn.sock.send(conn.outgoing)
+                del conn.outgoing[:sent]
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._log('Client has crashed')
+            self._disconnect(conn)
+            return
+        if conn.outgoing:
+            self.selector.modify(conn.sock, selectors.EVENT_WRITE, conn)
+        elif conn.closing:
+            self._disconnect(conn)
+        else:
+            self.selector.modify(conn.sock, selectors.EVENT_READ, conn)
+
+    def _disconnect(self, conn):
+        self.selector.unregister(conn.sock)
+        conn.sock.close()
+
+    def close(self):
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                self._disconnect(key.data)
+        self.selector.close()
+        super().close()
+
 
 class Client:
     """Keyboard-driven TCP client.
@@ -135,10 +249,11 @@ class Client:
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
-        print("Argument 's' or 'c' expected")
+        print("Argument 's', 'm' or 'c' expected")
         sys.exit(0) 
-    if sys.argv[1] == 's':
-        server = Server(ADDRESS, PORT)
+    if sys.argv[1] in ('s', 'm'):
+        server_class = Server if sys.argv[1] == 's' else ConcurrentServer
+        server = server_class(ADDRESS, PORT)
         try:
             server.run()
         except KeyboardInterrupt:
@@ -0,0 +1,113 @@
+"""Load generator for the servers from week40.
+
+The script opens many connections to the server at once, every connection
+sends a number of 'increment' commands (waiting for each response) and then
+says 'bye'. It reports the percentiles of the time the clients waited for the
+server's attention and of the latency of the requests, and the number of
+requests per second. Unless --port is given, the server of the chosen kind
+is started in a background thread of this process, e.g.:
+    python week40_load.py --connections 500 --requests 20
+    python week40_load.py --server serial --connections 20
+"""
+
+import argparse
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from week40 import ADDRESS, BACKLOG, BUFSIZE, Server, ConcurrentServer
+
+TIMEOUT = 10            # seconds to wait for a response
+
+
+def start_server(kind):
+    """Starts the server ('serial' or 'concurrent') listening on a free port
+    in a daemon thread, returns the port.
+    """
+
+    server_class = Server if kind == 'serial' else ConcurrentServer
+    server = server_class(ADDRESS, 0, verbose=False)
+    # the serial server listens only within run
+    server.my_socket.listen(BACKLOG)
+    threading.Thread(target=server.run, daemon=True).start()
+    return server.my_socket.getsockname()[1]
+
+
+def session(port, requests, start):
+    """Runs the session of one client, all clients begin when the start event
+    is set. Returns the number of seconds until the server has sent its
+    initial message and the list of latencies of the requests, or None if the
+    session failed.
+    """
+
+    latencies = []
+    start.wait()
+    began = time.perf_counter()
+    try:
+        with socket.create_connection((ADDRESS, port), timeout=TIMEOUT) as s:
+            s.recv(BUFSIZE)         # 'Server is listening...'
+            waited = time.perf_counter() - began
+            for i in range(requests):
+                sent = time.perf_counter()
+                s.sendall(f'increment {i}'.encode())
+                response = s.recv(BUFSIZE)
+                latencies.append(time.perf_counter() - sent)
+                if response != str(i + 1).encode():
+                    return None
+            s.sendall(b'bye')
+            s.recv(BUFSIZE)
+    except OSError:
+        return None
+    return waited, latencies
+
+
+def percentile(ordered, p):
+    """Returns the p-th percentile of the sorted list (nearest rank)."""
+
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def run(port, connections, requests):
+    """Prints latency percentiles and throughput of connections clients."""
+
+    start = threading.Event()
+    with ThreadPoolExecutor(connections) as pool:
+        futures = [pool.submit(session, port, requests, start)
+                   for i in range(connections)]
+        began = time.perf_counter()
+        start.set()
+        results = [future.result() for future in futures if future.result()]
+    elapsed = time.perf_counter() - began
+    print(f'{connections} connections x {requests} requests, '
+          f'{connections - len(results)} failed')
+    if results:
+        latencies = sorted(latency for waited, result in results
+                           for latency in result)
+        print(f'throughput: {len(latencies) / elapsed:.0f} requests/s')
+        report('wait for service', sorted(waited for waited, result in results))
+        report('request latency', latencies)
+
+
+def report(name, ordered):
+    """Prints percentiles of the sorted list of seconds."""
+
+    print(f'{name}: ' + ', '.join(
+        f'p{p} {percentile(ordered, p) * 1000:.2f}ms' for p in (50, 90, 99)) +
+        f', max {ordered[-1] * 1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load generator for week40')
+    parser.add_argument('--connections', type=int, default=200,
+                        help='number of simultaneous clients, default: 200')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='number of requests of every client, default: 50')
+    parser.add_argument('--server', choices=('serial', 'concurrent'),
+                        default='concurrent',
+                        help='kind of the server started locally, default: '
+                             'concurrent')
+    parser.add_argument('--port', type=int,
+                        help='port of an already running server')
+    arguments = parser.parse_args()
+    port = arguments.port or start_server(arguments.server)
+    run(port, arguments.connections, arguments.requests)
@@ -1,17 +1,176 @@
 """Simple TCP client - server application. This script must be executed with
 the argument either 's' or 'c', to start a server or a client, respectively.
 Only one client can be served at a time.
+
+With the second argument 'framed' the server and the client use the framed
+protocol: every message is preceded by a header with the request id and the
+length of the payload, so responses of any size are received completely and
+the client can send many commands without waiting for the responses.
+
+With the second argument 'oob' the framed protocol is used and in addition
+the server sends large binary data (bytes, bytearray, array.array and NumPy
+arrays) as pickle protocol 5 out-of-band buffers. They are sent directly from
+the memory of the objects and received into preallocated buffers, without
+copying them into the pickled data.
+
+In the framed protocol the client chooses the codec of the responses when it
+connects: pickle (the default), json or binary, the last two never create
+objects of arbitrary classes. The name of the codec can be given to the client
+as the third argument.
 """
 
+import array
+import io
+import json
 import socket
+import struct
 import sys
 import pickle
 import random
 import string
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 SERVER = '127.0.0.1'    # server's IP address
 PORT = 9999             # server's port
 BUFSIZE = 1024          # size of the buffer for received data
+# frame header: request id, number of out-of-band buffers, payload length,
+# it is followed by the lengths of the buffers (8 bytes each), the payload
+# and the buffers
+HEADER = struct.Struct('!IIQ')
+MAX_FRAME = 1 << 30     # maximal accepted length of the payload, 1GB
+MAX_BUFFERS = 1024      # maximal number of out-of-band buffers in a frame
+WINDOW = 64             # maximal number of pipelined requests without response
+OUT_OF_BAND = 65536     # minimal size of data sent in out-of-band buffers
+
+
+def send_frame(sock, payload, request_id=0, buffers=()):
+    """Sends the payload (bytes-like object) preceded by the frame header,
+    followed by the buffers (contiguous bytes-like objects) if any.
+    """
+
+    header = HEADER.pack(request_id, len(buffers), len(payload))
+    if not buffers:
+        sock.sendall(header + payload)
+        return
+    views = [memoryview(buffer).cast('B') for buffer in buffers]
+    lengths = struct.pack(f'!{len(views)}Q', *[len(view) for view in views])
+    send_all(sock, [header + lengths, memoryview(payload).cast('B'), *views])
+
+
+def send_all(sock, views):
+    """Sends all memoryviews with as few system calls as possible, without
+    joining them into a single buffer.
+    """
+
+    while views:
+        sent = sock.sendmsg(views[:MAX_BUFFERS])
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if sent:
+            views[0] = views[0][sent:]
+
+
+def recv_exactly(sock, size):
+    """Returns the bytearray of exactly size bytes received from the socket,
+    or None if the connection was closed before any of them arrived. Raises
+    ConnectionError if it was closed in the middle.
+    """
+
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            if received == 0:
+                return None
+            raise ConnectionError('Connection closed in the middle of a frame')
+        received += count
+    return data
+
+
+def recv_frame(sock):
+    """Returns (request id, payload, list of buffers) of the next frame or
+    None if the connection was closed. Every buffer is received into its own
+    bytearray.
+    """
+
+    header = recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    request_id, count, length = HEADER.unpack(header)
+    if count > MAX_BUFFERS:
+        raise ConnectionError(f'Too many buffers: {count}')
+    lengths = []
+    if count:
+        lengths = struct.unpack(f'!{count}Q', recv_part(sock, 8 * count))
+    if length > MAX_FRAME or sum(lengths) > MAX_FRAME:
+        raise ConnectionError('Frame too large')
+    payload = recv_part(sock, length)
+    return request_id, payload, [recv_part(sock, size) for size in lengths]
+
+
+def recv_part(sock, size):
+    """Returns the bytearray with the next size bytes of the started frame."""
+
+    data = recv_exactly(sock, size) if size else bytearray()
+    if data is None:
+        raise ConnectionError('Connection closed in the middle of a frame')
+    return data
+
+
+def _identity(obj):
+    return obj
+
+
+def _rebuild_bytes(buffer):
+    return bytes(buffer)
+
+
+def _rebuild_array(typecode, buffer):
+    data = array.array(typecode)
+    data.frombytes(buffer)
+    return data
+
+
+class _OutOfBand:
+    """Wrapper of bytes or bytearray object pickled as out-of-band buffer."""
+
+    __slots__ = ('obj', )
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __reduce_ex__(self, protocol):
+        rebuild = _identity if type(self.obj) is bytearray else _rebuild_bytes
+        return rebuild, (pickle.PickleBuffer(self.obj), )
+
+
+class BulkPickler(pickle.Pickler):
+    """Pickler passing the contents of large bytes, bytearray and array.array
+    objects to buffer_callback as out-of-band buffers (NumPy arrays do it
+    themselves). A bytearray is unpickled as the received buffer itself, bytes
+    and array.array objects are rebuilt from it with one copy.
+
+    The pickler never consults reducer_override for bytes and bytearray
+    objects, so only those passed to dump directly are sent out-of-band.
+    """
+
+    def dump(self, obj):
+        if type(obj) in (bytes, bytearray) and len(obj) >= OUT_OF_BAND:
+            obj = _OutOfBand(obj)
+        super().dump(obj)
+
+    def reducer_override(self, obj):
+        if type(obj) is not array.array or \
+                len(obj) * obj.itemsize < OUT_OF_BAND:
+            return NotImplemented
+        return _rebuild_array, (obj.typecode, pickle.PickleBuffer(obj))
+
 
 class Thing:
     """Silly class for testing transmission of pickled custom object over the
@@ -27,6 +186,214 @@ class Thing:
         return f'Thing: color = {self.color}, size = {self.size}, shape = {self.shape}'
 
 
+class PickleCodec:
+    """Encodes any picklable object, decoding may execute arbitrary code, so
+    it should be used only with trusted peers.
+    """
+
+    name = 'pickle'
+
+    def encode(self, obj):
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data, buffers=()):
+        return pickle.loads(data, buffers=buffers)
+
+
+class JsonCodec:
+    """Encodes numbers, strings, lists, dictionaries with string keys, sets
+    and objects of SAFE_CLASSES as JSON text.
+    """
+
+    name = 'json'
+
+    def encode(self, obj):
+        return json.dumps(obj, default=self._default,
+                          separators=(',', ':')).encode()
+
+    def decode(self, data, buffers=()):
+        return json.loads(data, object_hook=self._object_hook)
+
+    @staticmethod
+    def _default(obj):
+        if type(obj) in (set, frozenset):
+            return {'__set__': list(obj)}
+        if SAFE_CLASSES.get(type(obj).__name__) is type(obj):
+            return {'__class__': type(obj).__name__, 'attributes': vars(obj)}
+        raise TypeError(f'Can not encode {type(obj).__name__}')
+
+    @staticmethod
+    def _object_hook(dct):
+        if '__set__' in dct:
+            return set(dct['__set__'])
+        if '__class__' in dct:
+            return _restore(dct['__class__'], dct.get('attributes'))
+        return dct
+
+
+class BinaryCodec:
+    """Encodes None, booleans, 64-bit integers, floats, strings, bytes,
+    lists, tuples, sets, dictionaries and objects of SAFE_CLASSES in compact
+    tagged binary form. Lists of integers only are packed as arrays of 4 or 8
+    byte integers, lists of floats only as arrays of doubles. Decoding never
+    creates objects of other types.
+    """
+
+    name = 'binary'
+    INT = struct.Struct('<q')
+    FLOAT = struct.Struct('<d')
+    SIZE = struct.Struct('<I')
+    CONTAINERS = {list: b'L', tuple: b'U', set: b'S', frozenset: b'S'}
+    TYPECODES = 'iqd'       # of packed arrays
+
+    def encode(self, obj):
+        out = bytearray()
+        self._encode(obj, out)
+        return out
+
+    def _encode(self, obj, out):
+        kind = type(obj)
+        if obj is None:
+            out += b'N'
+        elif kind is bool:
+            out += b'T' if obj else b'F'
+        elif kind is int:
+            try:
+                out += b'i' + self.INT.pack(obj)
+            except struct.error:
+                raise ValueError(f'Integer out of range: {obj}') from None
+        elif kind is float:
+            out += b'd' + self.FLOAT.pack(obj)
+        elif kind is str or kind is bytes:
+            data = obj.encode() if kind is str else obj
+            out += (b's' if kind is str else b'b') + self.SIZE.pack(len(data))
+            out += data
+        elif kind is list and obj and self._packed(obj, out):
+            pass
+        elif kind in self.CONTAINERS:
+            out += self.CONTAINERS[kind] + self.SIZE.pack(len(obj))
+            for item in obj:
+                self._encode(item, out)
+        elif kind is dict:
+            out += b'M' + self.SIZE.pack(len(obj))
+            for key, value in obj.items():
+                self._encode(key, out)
+                self._encode(value, out)
+        elif SAFE_CLASSES.get(kind.__name__) is kind:
+            out += b'O'
+            self._encode(kind.__name__, out)
+            self._encode(vars(obj), out)
+        else:
+            raise TypeError(f'Can not encode {kind.__name__}')
+
+    def _packed(self, obj, out):
+        """Appends the list of integers or floats only as an array, returns
+        False for other lists.
+        """
+
+        types = set(map(type, obj))
+        if types == {float}:
+            data = array.array('d', obj)
+        elif types == {int}:
+            try:
+                data = array.array('i', obj)
+            except OverflowError:
+                try:
+                    data = array.array('q', obj)
+                except OverflowError:
+                    return False
+        else:
+            return False
+        if sys.byteorder == 'big':
+            data.byteswap()
+        out += b'A' + data.typecode.encode() + self.SIZE.pack(len(data))
+        out += data
+        return True
+
+    def decode(self, data, buffers=()):
+        """Returns the decoded object, raises ValueError if data is not
+        a valid encoding.
+        """
+
+        try:
+            obj, offset = self._decode(bytes(data), 0)
+        except (struct.error, IndexError, UnicodeDecodeError, TypeError,
+                RecursionError) as e:
+            raise ValueError(f'Invalid data: {e}') from None
+        if offset != len(data):
+            raise ValueError('Invalid data: unexpected bytes at the end')
+        return obj
+
+    def _decode(self, data, offset):
+        tag = chr(data[offset])
+        offset += 1
+        if tag == 'N':
+            return None, offset
+        if tag == 'T' or tag == 'F':
+            return tag == 'T', offset
+        if tag == 'i':
+            return self.INT.unpack_from(data, offset)[0], offset + 8
+        if tag == 'd':
+            return self.FLOAT.unpack_from(data, offset)[0], offset + 8
+        if tag == 's' or tag == 'b':
+            size = self.SIZE.unpack_from(data, offset)[0]
+            offset += 4
+            if offset + size > len(data):
+                raise IndexError('data too short')
+            if tag == 's':
+                return data[offset:offset + size].decode(), offset + size
+            return data[offset:offset + size], offset + size
+        if tag == 'A':
+            typecode = chr(data[offset])
+            if typecode not in self.TYPECODES:
+                raise ValueError(f'Invalid data: unknown typecode {typecode}')
+            items = array.array(typecode)
+            size = self.SIZE.unpack_from(data, offset + 1)[0]
+            offset += 5
+            end = offset + size * items.itemsize
+            if end > len(data):
+                raise IndexError('data too short')
+            items.frombytes(data[offset:end])
+            if sys.byteorder == 'big':
+                items.byteswap()
+            return items.tolist(), end
+        if tag in 'LUSM':
+            size = self.SIZE.unpack_from(data, offset)[0]
+            offset += 4
+            items = []
+            for i in range(2 * size if tag == 'M' else size):
+                item, offset = self._decode(data, offset)
+                items.append(item)
+            if tag == 'M':
+                return dict(zip(items[::2], items[1::2])), offset
+            return {'L': list, 'U': tuple, 'S': set}[tag](items), offset
+        if tag == 'O':
+            name, offset = self._decode(data, offset)
+            attributes, offset = self._decode(data, offset)
+            return _restore(name, attributes), offset
+        raise ValueError(f'Invalid data: unknown tag {tag!r}')
+
+
+def _restore(name, attributes):
+    """Returns the object of the class from SAFE_CLASSES, its attributes are
+    set without calling __init__.
+    """
+
+    cls = SAFE_CLASSES.get(name)
+    if cls is None or type(attributes) is not dict:
+        raise ValueError(f'Unsupported class: {name}')
+    obj = cls.__new__(cls)
+    obj.__dict__.update(attributes)
+    return obj
+
+
+# classes which objects can be sent by the codecs other than pickle
+SAFE_CLASSES = {'Thing': Thing}
+# available codecs in the order of preference of the client
+CODECS = {codec.name: codec for codec in (PickleCodec(), JsonCodec(),
+                                          BinaryCodec())}
+
+
 class Server:
     """TCP server which understands a few commands.
 
@@ -34,8 +401,16 @@ class Server:
     from its controlling terminal and can be stopped by pressing Ctrl-C.
     """
 
-    def __init__(self, port):
+    def __init__(self, port, framed=False, out_of_band=False, codecs=None):
 
+        # use the framed protocol, out-of-band buffers require it
+        self.framed = framed or out_of_band
+        self.out_of_band = out_of_band
+        # names of codecs accepted in the framed protocol, the first one is
+        # used if the client does not choose any
+        self.codecs = list(codecs or CODECS)
+        self.codec = None       # codec of the current connection
+        self.request_id = 0     # id of the request being processed
         self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.my_socket.bind((socket.gethostbyname('localhost'), port))
         self.my_socket.listen()
@@ -48,6 +423,7 @@ class Server:
                     'numbers': (self.numbers, '[integer]'),
                     'random': (self.random, None),
                     'thing': (self.thing, None),
+                    'bulk': (self.bulk, '[bytes|bytearray|array|numpy] [megabytes]'),
                     'bye': (self.bye, None)}
 
     def run(self):
@@ -65,28 +441,78 @@ class Server:
                          for key, value in self.cmd.items()]
                 msg = ('Available commands, some with optional argument:\n\t' +
                        '\n\t'.join(funcs) + '\nServer is listening...')
-                self.conn.sendall(msg.encode()) 
-                # handling client - server exchanges 
-                while True:
-                    # command and its argument, if any
-                    received = self.conn.recv(BUFSIZE).decode()
-                    if not received:
-                        print('Client has crashed')
-                        break
-                    command, *data = received.split()
-                    if command in self.cmd:
-                        # all command processing methods return False, except
-                        # the method processing 'bye' command which returns
-                        # True, that terminates connection with the client
-                        if self.cmd[command][0](data):
-                            break
-                    else:
-                        self._unknown(command)
-            
+                if self.framed:
+                    msg += '\nCodecs: ' + ' '.join(self.codecs)
+                    send_frame(self.conn, msg.encode())
+                    self._serve_framed()
+                else:
+                    self.conn.sendall(msg.encode())
+                    self._serve()
+
+    def _serve(self):
+        """Handles exchanges with the client, every received chunk of data is
+        a command.
+        """
+
+        while True:
+            received = self.conn.recv(BUFSIZE).decode()
+            if not received:
+                print('Client has crashed')
+                break
+            if self._handle(received):
+                break
+
+    def _serve_framed(self):
+        """Handles exchanges with the client, every frame is a command, the
+        response is sent in a frame with the same request id. The first frame
+        may instead be 'codec' followed by the names of codecs preferred by
+        the client, the server responds with the name of the chosen one, or
+        an empty frame if none of them is accepted.
+        """
+
+        self.codec = CODECS[self.codecs[0]]
+        first = True
+        while True:
+            try:
+                frame = recv_frame(self.conn)
+            except OSError:
+                frame = None
+            if frame is None:
+                print('Client has crashed')
+                break
+            self.request_id, payload, buffers = frame
+            # invalid bytes must not end the server
+            command = payload.decode('utf-8', errors='replace')
+            if first and command.startswith('codec'):
+                chosen = [name for name in command.split()[1:]
+                          if name in self.codecs][:1]
+                send_frame(self.conn, ''.join(chosen).encode(), self.request_id)
+                if not chosen:
+                    print('No common codec with the client')
+                    break
+                self.codec = CODECS[chosen[0]]
+            elif self._handle(command):
+                break
+            first = False
+
+    def _handle(self, received):
+        """Processes the command and its argument, if any. Returns True if the
+        connection with the client should be terminated.
+        """
+
+        command, *data = received.split() or ['']
+        if command in self.cmd:
+            # all command processing methods return False, except the method
+            # processing 'bye' command which returns True, that terminates
+            # connection with the client
+            return self.cmd[command][0](data)
+        self._unknown(command)
+        return False
+
     def echo(self, msg):
         """Sends an echo to the client."""
 
-        self.conn.sendall(self._pickle(' '.join(msg)))
+        self._send(' '.join(msg))
         return False
 
     def numbers(self, n):
@@ -102,13 +528,13 @@ class Server:
                 msg = f'Invalid number: {n[0]}'
         else:
             msg = [i for i in range(10)]
-        self.conn.sendall(self._pickle(msg))
+        self._send(msg)
         return False
 
     def random(self, ignored):
         """Sends a random number between 0 and 1."""
 
-        self.conn.sendall(self._pickle(random.random()))
+        self._send(random.random())
         return False
 
     def characters(self, data):
@@ -120,34 +546,95 @@ class Server:
             chars = set(string.ascii_lowercase)
         else:
             chars = set(''.join(data))
-        self.conn.sendall(self._pickle(chars))
+        self._send(chars)
         return False
 
     def thing(self, ignored):
         """Sends a random Thing object."""
 
-        self.conn.sendall(self._pickle(Thing()))
+        self._send(Thing())
+        return False
+
+    def bulk(self, args):
+        """By default sends 1 megabyte of zero bytes, the kind of the object
+        and the number of megabytes can be specified as arguments.
+        """
+
+        kind = args[0] if args else 'bytes'
+        try:
+            size = int(float(args[1]) * 1048576) if len(args) > 1 else 1048576
+        except ValueError:
+            self._send(f'Invalid number: {args[1]}')
+            return False
+        if kind == 'bytes':
+            data = bytes(size)
+        elif kind == 'bytearray':
+            data = bytearray(size)
+        elif kind == 'array':
+            data = array.array('d', bytes(size - size % 8))
+        elif kind == 'numpy' and np is not None:
+            data = np.zeros(size // 8)
+        else:
+            data = f'Unsupported kind: {kind}'
+        self._send(data)
         return False
 
     def bye(self, ignore):
         """Sends final good-bye to the client."""
 
-        self.conn.sendall(self._pickle('bye'))
+        self._send('bye')
         print('Client has signed-off')
         return True
 
     def _unknown(self, arg):
         """Responds to unrecognised command."""
 
-        self.conn.sendall(self._pickle(f'Unknown command: {arg}'))
+        self._send(f'Unknown command: {arg}')
+
+    def _send(self, obj):
+        """Sends the pickled (or encoded by the chosen codec) object to the
+        client.
+        """
 
-    def _pickle(self, obj):
+        if self.framed and self.codec.name != 'pickle':
+            send_frame(self.conn, self._encode(obj), self.request_id)
+        elif self.out_of_band:
+            buffers = []
+            payload = self._pickle(obj, buffers.append)
+            send_frame(self.conn, payload, self.request_id,
+                       [buffer.raw() for buffer in buffers])
+        elif self.framed:
+            send_frame(self.conn, self._pickle(obj), self.request_id)
+        else:
+            self.conn.sendall(self._pickle(obj))
+
+    def _encode(self, obj):
+        """Returns the object encoded by the codec of the connection or an
+        error message when it can not be encoded.
+        """
+
+        try:
+            return self.codec.encode(obj)
+        except (TypeError, ValueError) as e:
+            return self.codec.encode(f'Internal server error - {e}')
+
+    def _pickle(self, obj, buffer_callback=None):
         """Returns a pickled object or an error message when pickling was not
-        possible.
+        possible. If buffer_callback is given, large binary data is passed to
+        it as out-of-band buffers.
         """
 
         try:
-            bytes = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+            if buffer_callback is None:
+                bytes = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                out = io.BytesIO()
+                buffers = []
+                BulkPickler(out, protocol=5,
+                            buffer_callback=buffers.append).dump(obj)
+                bytes = out.getvalue()
+                for buffer in buffers:
+                    buffer_callback(buffer)
         except pickle.PicklingError:
             bytes = b'Internal server error - pickling'
         return bytes
@@ -204,12 +691,135 @@ class Client:
                     break
 
 
+class FramedClient:
+    """TCP client of the server using the framed protocol.
+
+    Commands can be sent one by one with call, or pipelined with pipeline,
+    which sends the next commands before the responses to the previous ones
+    arrive. Responses are matched with commands by request ids. The names of
+    codecs in the order of preference can be passed in codecs, the server
+    chooses one of them when the client connects.
+    """
+
+    def __init__(self, address, port, timeout=3, codecs=None):
+        self.addr = address
+        self.port = port
+        self.timeout = timeout  # seconds to wait for server's attention
+        self.codecs = list(codecs or CODECS)
+        self.codec = None       # codec chosen by the server
+        self.sock = None
+        self.next_id = 1
+
+    def connect(self):
+        """Connects to the server and returns its initial message. Raises
+        socket.timeout if the server is busy with another client.
+        """
+
+        self.sock = socket.create_connection((self.addr, self.port),
+                                             timeout=self.timeout)
+        frame = recv_frame(self.sock)
+        if frame is None:
+            raise ConnectionError('Connection closed by the server')
+        greeting = frame[1].decode()
+        send_frame(self.sock, ('codec ' + ' '.join(self.codecs)).encode())
+        frame = recv_frame(self.sock)
+        if not frame or not frame[1]:
+            raise ConnectionError('No common codec with the server')
+        name = frame[1].decode('utf-8', errors='replace')
+        # a codec not offered (e.g. pickle) must not be forced by the server
+        if name not in self.codecs:
+            raise ConnectionError(f'Codec not requested: {name}')
+        self.codec = CODECS[name]
+        # after receiving initial server's message the client knows that
+        # connection has been established, assumes timeout not needed now
+        self.sock.settimeout(None)
+        return greeting
+
+    def send(self, command):
+        """Sends the command without waiting for the response, returns its
+        request id.
+        """
+
+        request_id = self.next_id
+        self.next_id = self.next_id % 0xffffffff + 1
+        send_frame(self.sock, command.encode(), request_id)
+        return request_id
+
+    def receive(self):
+        """Returns (request id, object) of the next response."""
+
+        frame = recv_frame(self.sock)
+        if frame is None:
+            raise ConnectionError('Connection closed by the server')
+        request_id, payload, buffers = frame
+        try:
+            obj = self.codec.decode(payload, buffers)
+        except Exception:
+            obj = f'Can not decode the received object ({self.codec.name})'
+        return request_id, obj
+
+    def call(self, command):
+        """Sends the command and returns the response."""
+
+        self.send(command)
+        return self.receive()[1]
+
+    def pipeline(self, commands, window=WINDOW):
+        """Sends all commands keeping at most window of them without response
+        (so neither side blocks on full socket buffers), returns the list of
+        responses in the order of commands.
+        """
+
+        ids = []
+        responses = {}
+        for command in commands:
+            if len(ids) - len(responses) == window:
+                request_id, obj = self.receive()
+                responses[request_id] = obj
+            ids.append(self.send(command))
+        while len(responses) < len(ids):
+            request_id, obj = self.receive()
+            responses[request_id] = obj
+        return [responses[request_id] for request_id in ids]
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def run(self):
+        """Runs the client and displays server's responses, several commands
+        separated by semicolons are pipelined.
+        """
+
+        try:
+            print(self.connect())
+        except ConnectionRefusedError:
+            print('Can not connect to the server')
+            sys.exit(0)
+        except socket.timeout:
+            print('Server is busy')
+            sys.exit(0)
+        try:
+            while True:
+                send = input('MESSAGES TO SEND (separated by ;): ')
+                commands = [command.strip() for command in send.split(';')]
+                for obj in self.pipeline(commands):
+                    print(f'RESPONSE: {obj}\n\t{type(obj)}')
+                if 'bye' in commands:
+                    break
+        finally:
+            self.close()
+
+
 if __name__ == '__main__':
     if len(sys.argv) < 2:
         print("Argument 's' or 'c' expected")
         sys.exit(0) 
+    mode = sys.argv[2] if len(sys.argv) > 2 else None
+    framed = mode in ('framed', 'oob')
     if sys.argv[1] == 's':
-        server = Server(PORT)
+        server = Server(PORT, framed, mode == 'oob')
         try:
             server.run()
         except KeyboardInterrupt:
@@ -217,7 +827,10 @@ if __name__ == '__main__':
             print(' Good bye!')
             sys.exit(0)
     elif sys.argv[1] == 'c':
-        client = Client(SERVER, PORT)
+        if framed:
+            client = FramedClient(SERVER, PORT, codecs=sys.argv[3:4] or None)
+        else:
+            client = Client(SERVER, PORT)
         client.run()
     else:
         print(f'Unknown argument: {sys.argv[1]}')
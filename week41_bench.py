@@ -0,0 +1,155 @@
+"""Benchmarks for the framed protocol of week41.
+
+The script starts the framed server in a background thread on a free port,
+then measures how long it takes to receive large payloads (the response to
+'numbers' with a million integers by default) and how many small requests per
+second are handled when the client waits for every response and when the
+requests are pipelined. The server and the client share one interpreter (and
+its GIL), so the results are lower bounds of what separate processes achieve.
+
+With the --bulk option the script instead compares sending large binary
+objects pickled in-band with sending them in out-of-band buffers: it reports
+the throughput and the peak of memory allocated during a transfer (by the
+server and the client together) relative to the size of the object.
+
+With the --codecs option the script instead measures encoding and decoding of
+responses to the numbers, characters, random and thing commands by every
+codec, and the throughput of the numbers command over the network.
+"""
+
+import argparse
+import pickle
+import random
+import string
+import threading
+import time
+import tracemalloc
+from week41 import SERVER, Server, FramedClient, Thing, CODECS, np
+
+
+def start_server(out_of_band=False):
+    """Starts the framed server in a daemon thread, returns its port."""
+
+    server = Server(0, framed=True, out_of_band=out_of_band)
+    threading.Thread(target=server.run, daemon=True).start()
+    return server.my_socket.getsockname()[1]
+
+
+def timed(func, *args, **kwargs):
+    """Returns the result of the func call and the number of seconds spent."""
+
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bulk(megabytes, repeat):
+    """Prints throughput and memory peaks of transfers of bulk data."""
+
+    kinds = ['bytes', 'bytearray', 'array'] + (['numpy'] if np else [])
+    size = int(megabytes * 1048576)
+    print(f'{repeat} x {megabytes}MB')
+    for out_of_band in (False, True):
+        client = FramedClient(SERVER, start_server(out_of_band))
+        client.connect()
+        for kind in kinds:
+            command = f'bulk {kind} {megabytes}'
+            client.call(command)    # warm up
+            seconds = timed(lambda: [client.call(command)
+                                     for i in range(repeat)])[1]
+            tracemalloc.start()
+            client.call(command)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            mode = 'out-of-band' if out_of_band else 'in-band'
+            print(f'{mode:>11} {kind:>9}: '
+                  f'{size * repeat / seconds / 1048576:>6.0f}MB/s, '
+                  f'peak memory {peak / size:.1f} x size')
+        client.call('bye')
+        client.close()
+
+
+def codecs(numbers, repeat):
+    """Prints times of encoding and decoding of typical responses and the
+    throughput of the numbers command with every codec.
+    """
+
+    responses = {f'numbers {numbers}': list(range(numbers)),
+                 'numbers': list(range(10)),
+                 'characters': set(string.ascii_lowercase),
+                 'random': random.random(),
+                 'thing': Thing()}
+    for command, obj in responses.items():
+        print(command)
+        # small objects are encoded many times to get measurable times
+        count = repeat if len(command) > 12 else 10000
+        for name, codec in CODECS.items():
+            data, encode = timed(lambda: [codec.encode(obj)
+                                          for i in range(count)])
+            decode = timed(lambda: [codec.decode(data[0])
+                                    for i in range(count)])[1]
+            print(f'{name:>10}: encode {encode / count * 1e6:>9.1f}us, '
+                  f'decode {decode / count * 1e6:>9.1f}us, '
+                  f'{len(data[0]):>8} bytes')
+    port = start_server()
+    command = f'numbers {numbers}'
+    print(f'{repeat} x {command} over the network')
+    for name in CODECS:
+        client = FramedClient(SERVER, port, codecs=[name])
+        client.connect()
+        seconds = timed(lambda: [client.call(command)
+                                 for i in range(repeat)])[1]
+        print(f'{name:>10}: {seconds / repeat * 1000:>7.1f}ms per response')
+        client.call('bye')
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the framed protocol')
+    parser.add_argument('--numbers', type=int, default=1000000,
+                        help='number of integers in a large payload, '
+                             'default: 1000000')
+    parser.add_argument('--large', type=int, default=10,
+                        help='number of large payloads, default: 10')
+    parser.add_argument('--small', type=int, default=20000,
+                        help='number of small requests, default: 20000')
+    parser.add_argument('--window', type=int, nargs='+', default=[8, 64, 512],
+                        help='numbers of pipelined requests without response, '
+                             'default: 8 64 512')
+    parser.add_argument('--bulk', type=float, metavar='megabytes',
+                        help='only compare transfers of bulk data of this size')
+    parser.add_argument('--codecs', action='store_true',
+                        help='only compare codecs')
+    arguments = parser.parse_args()
+    if arguments.codecs:
+        codecs(arguments.numbers, arguments.large)
+        raise SystemExit
+    if arguments.bulk:
+        bulk(arguments.bulk, arguments.large)
+        raise SystemExit
+    client = FramedClient(SERVER, start_server())
+    client.connect()
+
+    command = f'numbers {arguments.numbers}'
+    size = len(pickle.dumps(list(range(arguments.numbers)),
+                            protocol=pickle.HIGHEST_PROTOCOL))
+    seconds = timed(lambda: [client.call(command)
+                             for i in range(arguments.large)])[1]
+    print(f'{arguments.large} x {command} ({size / 1048576:.1f}MB): '
+          f'{seconds / arguments.large * 1000:.1f}ms per response, '
+          f'{size * arguments.large / seconds / 1048576:.0f}MB/s')
+    seconds = timed(client.pipeline, [command] * arguments.large)[1]
+    print(f'{"pipelined":>{len(command) + 5}}: '
+          f'{seconds / arguments.large * 1000:.1f}ms per response, '
+          f'{size * arguments.large / seconds / 1048576:.0f}MB/s')
+
+    print(f'{arguments.small} x random')
+    seconds = timed(lambda: [client.call('random')
+                             for i in range(arguments.small)])[1]
+    print(f'{"one by one":>14}: {arguments.small / seconds:>8.0f} requests/s')
+    for window in arguments.window:
+        seconds = timed(client.pipeline, ['random'] * arguments.small,
+                        window)[1]
+        print(f'{window:>7} window: {arguments.small / seconds:>8.0f} requests/s')
+    client.call('bye')
+    client.close()
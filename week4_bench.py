@@ -0,0 +1,170 @@
+"""Benchmarks for parsing access logs with LogDicts.
+
+The script generates a temporary access log with the given number of lines,
+then measures how long it takes to load it and answer typical queries with
+LogDicts objects working line by line, in the columnar mode and with indexes,
+and with LogStream objects which read the file for every query. The baseline
+column works line by line as the original code did: every line is parsed by
+the verbose regular expression passed as a string to re.search and every
+timestamp by datetime.strptime.
+
+With the --parallel option the script instead reports the throughput (lines
+per second) of week3.process_log_file and of its parallel version with pools
+of worker processes of various sizes.
+
+With the --parsers option the script compares strategies of parsing single
+lines: regular expressions passed as strings to the re module functions (as
+before), precompiled ones and LogParser objects with and without extraction
+of fields by string methods.
+"""
+
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+from datetime import datetime
+from week3 import (process_log_file, process_log_file_parallel, LogParser,
+                   PATTERN, compiled)
+from week4 import LogDicts, LogStream, LINE_PATTERN
+
+
+START = 1264802598      # 30 Jan 2010 00:03:18 +0200
+
+
+class BaselineLogDicts(LogDicts):
+    """LogDicts parsing lines and timestamps as the original code did."""
+
+    @staticmethod
+    def _line_to_dict(line):
+        match = re.search(LINE_PATTERN.pattern, line, re.X)
+        if match:
+            return match.groupdict()
+        return {'ip_address': 'No IP address found',
+                'timestamp': 'No timestamp found',
+                'request': 'No request found'}
+
+    def _time_convert(self, entry):
+        return datetime.strptime(entry['timestamp'],
+                                 '%d/%b/%Y:%H:%M:%S %z').timestamp()
+
+
+def make_log(file_name, lines, ips=5000, seed=0):
+    """Writes the access log with lines entries in the Apache combined format.
+    The entries are in the time order, a few of them per second.
+    """
+
+    rnd = random.Random(seed)
+    addresses = [f'{rnd.randint(1, 223)}.{rnd.randint(0, 255)}.'
+                 f'{rnd.randint(0, 255)}.{rnd.randint(1, 254)}'
+                 for i in range(ips)]
+    paths = ['/', '/index.html', '/robots.txt', '/favicon.ico',
+             '/blog/feed/', '/images/logo.png', '/about/', '/contact/'] + \
+            [f'/blog/{year}/{month:02}/post-{i}/' for year in (2009, 2010)
+             for month in range(1, 13) for i in range(10)]
+    start = START
+    with open(file_name, 'w') as f:
+        for i in range(lines):
+            stamp = time.strftime('%d/%b/%Y:%H:%M:%S',
+                                  time.gmtime(start + 7200 + i // 4))
+            f.write(f'{rnd.choice(addresses)} - - [{stamp} +0200] '
+                    f'"GET {rnd.choice(paths)} HTTP/1.1" 200 {rnd.randint(100, 99999)} '
+                    f'"-" "Mozilla/5.0 (X11; Linux x86_64)"\n')
+    return addresses
+
+
+def timed(func, *args, **kwargs):
+    """Returns the result of the func call and the number of seconds spent."""
+
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(file_name, addresses, queries, log_class, **options):
+    """Returns a list of (description, seconds) for the log_class options."""
+
+    logs, load = timed(log_class, file_name, **options)
+    results = [('load', load)]
+    results.append(('dicts', timed(logs.dicts)[1]))
+    results.append(('latest + earliest',
+                    timed(lambda: (logs.latest(), logs.earliest()))[1]))
+    results.append((f'{queries} x for_ip', timed(lambda: [
+        list(logs.for_ip(ip)) for ip in addresses[:queries]])[1]))
+    results.append((f'{queries} x for_request', timed(lambda: [
+        list(logs.for_request(f'post-{i}/')) for i in range(queries)])[1]))
+    results.append((f'{queries} x between', timed(lambda: [
+        list(logs.between(START + 600 * i, START + 600 * i + 59))
+        for i in range(queries)])[1]))
+    results.append(('aggregations', timed(lambda: (
+        logs.count('ip_address'), logs.top('path', 10),
+        logs.histogram(60)))[1]))
+    return results
+
+
+def parsers(file_name):
+    """Returns a list of (description, lines per second) for line parsers."""
+
+    with open(file_name) as f:
+        lines = f.readlines()
+    strategies = [
+        ('week3 re.match(string)', lambda line: re.match(PATTERN, line)),
+        ('week3 precompiled', compiled(PATTERN).match),
+        ('week4 re.search(string)',
+         lambda line: re.search(LINE_PATTERN.pattern, line, re.X)),
+        ('week4 precompiled', LINE_PATTERN.search),
+        ('common regex', LogParser('common').parse),
+        ('common split', LogParser('common', split=True).parse),
+        ('combined regex', LogParser('combined').parse),
+        ('combined split', LogParser('combined', split=True).parse)]
+    results = []
+    for name, parse in strategies:
+        seconds = timed(lambda: [parse(line) for line in lines])[1]
+        results.append((name, len(lines) / seconds))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks LogDicts')
+    parser.add_argument('--lines', type=int, default=1000000,
+                        help='number of lines in the log, default: 1000000')
+    parser.add_argument('--queries', type=int, default=10,
+                        help='number of for_ip and for_request queries, '
+                             'default: 10')
+    parser.add_argument('--parallel', type=int, nargs='+', metavar='workers',
+                        help='only measure parsing with these numbers of '
+                             'worker processes')
+    parser.add_argument('--parsers', action='store_true',
+                        help='only compare strategies of parsing lines')
+    arguments = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        file_name = os.path.join(tmp, 'access.log')
+        addresses = make_log(file_name, arguments.lines)
+        if arguments.parsers:
+            print(f'{arguments.lines} lines')
+            for name, speed in parsers(file_name):
+                print(f'{name:>24}: {speed:>10.0f} lines/s')
+            raise SystemExit
+        if arguments.parallel:
+            print(f'{arguments.lines} lines')
+            seconds = timed(process_log_file, file_name)[1]
+            print(f'{"sequential":>12}: {arguments.lines / seconds:>10.0f} lines/s')
+            for workers in arguments.parallel:
+                seconds = timed(process_log_file_parallel, file_name, workers)[1]
+                print(f'{workers:>4} workers: '
+                      f'{arguments.lines / seconds:>10.0f} lines/s')
+            raise SystemExit
+        modes = {'baseline': (BaselineLogDicts, {}),
+                 'lines': (LogDicts, {}),
+                 'columnar': (LogDicts, {'columnar': True}),
+                 'indexed': (LogDicts, {'columnar': True, 'indexed': True}),
+                 'stream': (LogStream, {})}
+        results = {mode: run(file_name, addresses, arguments.queries,
+                             log_class, **options)
+                   for mode, (log_class, options) in modes.items()}
+        print(f'{arguments.lines} lines')
+        print(f'{"":>20}' + ''.join(f'{mode:>12}' for mode in modes))
+        for row in zip(*results.values()):
+            print(f'{row[0][0]:>20}' +
+                  ''.join(f'{seconds:>11.2f}s' for name, seconds in row))